@@ -13,6 +13,37 @@ class Settings(BaseSettings):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./database.db")
     SQL_DEBUG: bool = os.getenv("SQL_DEBUG", "False").lower() == "true"
     
+    # Ingest settings
+    BULK_INSERT_CHUNK_SIZE: int = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 10000))
+    INGEST_UPSERT_MODE: str = os.getenv("INGEST_UPSERT_MODE", "append")  # append, ignore or update
+    INGEST_PARSE_BLOCK_BYTES: int = int(os.getenv("INGEST_PARSE_BLOCK_BYTES", 4 * 1024 * 1024))
+    INGEST_DB_WORKERS: int = int(os.getenv("INGEST_DB_WORKERS", 3))
+    INGEST_PARSE_WORKERS: int = int(os.getenv("INGEST_PARSE_WORKERS", 2))  # 0 parses in the writer thread
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", 20))
+    JOB_RETENTION_HOURS: int = int(os.getenv("JOB_RETENTION_HOURS", 72))
+    JOB_HEARTBEAT_SECONDS: float = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))  # refresh of queued and running jobs
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", 300))  # unrefreshed this long, a job is failed
+    UPLOAD_SPOOL_CHUNK_BYTES: int = int(os.getenv("UPLOAD_SPOOL_CHUNK_BYTES", 1024 * 1024))
+    
+    # Data API settings
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", 5000))
+    EMPLOYEE_PROFILE_CACHE_TTL: float = float(os.getenv("EMPLOYEE_PROFILE_CACHE_TTL", 60))  # seconds, 0 disables
+    EMPLOYEE_PROFILE_CACHE_SIZE: int = int(os.getenv("EMPLOYEE_PROFILE_CACHE_SIZE", 2048))
+    REPORT_BATCH_SIZE: int = int(os.getenv("REPORT_BATCH_SIZE", 500))  # employees per query in batch reports
+    REPORT_CACHE_SIZE: int = int(os.getenv("REPORT_CACHE_SIZE", 256))  # 0 disables, ETags still work
+    ANALYTICS_STORE_ENABLED: bool = os.getenv("ANALYTICS_STORE_ENABLED", "False").lower() == "true"
+    ANALYTICS_STORE_MAX_BYTES: int = int(os.getenv("ANALYTICS_STORE_MAX_BYTES", 256 * 1024 * 1024))
+    TIMESERIES_MAX_POINTS: int = int(os.getenv("TIMESERIES_MAX_POINTS", 500))  # default chart size after downsampling
+    RISK_RECENT_DAYS: int = int(os.getenv("RISK_RECENT_DAYS", 30))  # window for work hours and mood
+    RISK_LEAVE_DAYS: int = int(os.getenv("RISK_LEAVE_DAYS", 90))  # window for leave frequency
+    
+    # Chatbot client settings
+    CHATBOT_TIMEOUT: float = float(os.getenv("CHATBOT_TIMEOUT", 30))  # seconds per read or write
+    CHATBOT_CONNECT_TIMEOUT: float = float(os.getenv("CHATBOT_CONNECT_TIMEOUT", 5))
+    CHATBOT_POOL_TIMEOUT: float = float(os.getenv("CHATBOT_POOL_TIMEOUT", 10))  # wait for a free connection
+    CHATBOT_MAX_CONNECTIONS: int = int(os.getenv("CHATBOT_MAX_CONNECTIONS", 200))  # chat turns in flight per worker
+    CHATBOT_MAX_KEEPALIVE: int = int(os.getenv("CHATBOT_MAX_KEEPALIVE", 50))
+    
     # App settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key_here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
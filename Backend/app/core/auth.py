@@ -1,12 +1,15 @@
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional, Annotated
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Cookie
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, SessionLocal
 from app.models.user import User, UserRole
 from app.config import settings
 
@@ -19,6 +22,10 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Stored instead of a hash for accounts provisioned in bulk. Until their first
+# login these accept the username as password, the bcrypt hash is computed then.
+DEFERRED_PASSWORD = "!deferred"
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -29,6 +36,13 @@ def authenticate_user(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username).first()
     if not user:
         return False
+    if user.hashed_password == DEFERRED_PASSWORD:
+        if not hmac.compare_digest(password.encode(), user.username.encode()):
+            return False
+        # First login of a provisioned account, replace the marker with a real hash
+        user.hashed_password = get_password_hash(password)
+        db.commit()
+        return user
     if not verify_password(password, user.hashed_password):
         return False
     return user
@@ -43,27 +57,47 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str | None, Cookie()] = None, db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _token_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    if token is not None:
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-        except JWTError:
-            raise credentials_exception
+
+def _token_username(token: Optional[str]) -> str:
+    """Username in the subject of a valid access token, 401 otherwise"""
+    if token is None:
+        raise _token_error()
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username: str = payload.get("sub")
+    except JWTError:
+        raise _token_error()
+    if username is None:
+        raise _token_error()
+    return username
+
+def get_current_user(token: Annotated[str | None, Cookie()] = None):
+    username = _token_username(token)
+    # Own short-lived session, closing the request's session would detach what the endpoint loads on it.
+    # Nothing is committed, so the user's columns stay loaded after the close.
+    with SessionLocal() as db:
         user = db.query(User).filter(User.username == username).first()
-        if user is None:
-            raise credentials_exception
-        return user
-    else:
-        raise credentials_exception
+    if user is None:
+        raise _token_error()
+    return user
+
+async def get_current_user_async(token: Annotated[str | None, Cookie()] = None):
+    if AsyncSessionLocal is None:
+        # No async driver for this database
+        return await run_in_threadpool(get_current_user, token)
+    username = _token_username(token)
+    # Own short-lived session as above
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+    if user is None:
+        raise _token_error()
+    return user
 
 # Role-based access control
 def is_hr(user: User = Depends(get_current_user)):
@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi.concurrency import run_in_threadpool
 from app.config import settings
 import logging
 
@@ -33,13 +36,69 @@ else:
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the same database, used by the endpoints that await their queries
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database URL for its asyncio counterpart"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _create_async_engine():
+    """Async engine for the configured database, None when it has no async driver"""
+    backend = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        logger.info(f"No async driver for {backend} databases, async endpoints use the sync session")
+        return None
+    try:
+        if backend == "postgresql":
+            return create_async_engine(
+                async_database_url(SQLALCHEMY_DATABASE_URL),
+                pool_size=5,
+                max_overflow=10,
+                pool_timeout=30,
+                pool_recycle=1800,
+                pool_pre_ping=True,
+                echo=settings.SQL_DEBUG,
+            )
+        return create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL))
+    except ImportError as e:
+        logger.warning(f"Async driver for {backend} is not installed ({e}), async endpoints use the sync session")
+        return None
+
+async_engine = _create_async_engine()
+
+# Objects stay readable after commit, attribute refreshes would need an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine is not None else None
+
 # Base class for models
 Base = declarative_base()
 
+def create_missing_indexes():
+    """Create indexes added to models after their tables already existed"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 # Dependency for FastAPI routes
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Async session, or a sync one for databases without an async driver"""
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
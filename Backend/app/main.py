@@ -1,19 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, BackgroundTasks, Response, Body, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, BackgroundTasks, Request, Response, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 import pandas as pd
 import logging
 from typing import List, Optional
 import os
+import hashlib
+import tempfile
 from datetime import datetime, timedelta, date
 import uuid
 
-from app.core.database import get_db, engine, Base
+from app.core.database import get_db, get_async_db, engine, async_engine, Base, SessionLocal, create_missing_indexes
 from app.services.csv_processor import CSVProcessor
+from app.services.pagination import InvalidQuery
+from app.services.row_serializer import dumps
+from app.services.employee_profile import get_employee_profile_async
+from app.services.report_cache import cached_report
+from app.services.report_summary import SummaryNotBuilt
+from app.services.analytics_store import analytics_store
+from app.services.timeseries import metric_timeseries
+from app.services.risk_scores import ranked_risk
+from app.services.natural_keys import sync_natural_key_indexes
+from app.services.ingest_executor import IngestQueueFull, get_ingest_executor, shutdown_ingest_executor
+from app.services.job_registry import start_job_monitor, stop_job_monitor
 from app.models.user import User, UserRole
-from app.core.auth import authenticate_user, create_access_token, get_current_user, is_hr
+from app.core.auth import authenticate_user, create_access_token, get_current_user, get_current_user_async, is_hr
 from app.config import settings
 from app.models.employee import Employee
 from app.core.auth import get_password_hash
@@ -23,9 +39,13 @@ from app.models.leave import LeaveTracker
 from app.models.performance import PerformanceTracker
 from app.models.rewards import RewardsTracker
 from app.models.onboarding import OnboardingTracker
-from app.report.report import generate_collective_report, generate_individual_report, generate_selective_report
+from app.report.report import (
+    department_employee_ids, generate_collective_report, generate_individual_report, generate_selective_report,
+    stream_individual_reports
+)
 from app.models.chat import ChatResponse, ChatStartRequest, ChatMessageRequest, ChatHistoryResponse, ChatHistorySession, ChatMessageModel
 from app.services.chat_service import ChatService
+from app.services.chatbot_client import close_chatbot_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +54,9 @@ logger = logging.getLogger(__name__)
 # Create database tables
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+create_missing_indexes()
+with SessionLocal() as db:
+    sync_natural_key_indexes(db)
 print("Database tables created successfully!")
 
 app = FastAPI(title="Employee Engagement API")
@@ -47,6 +70,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def monitor_jobs():
+    start_job_monitor()
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    shutdown_ingest_executor()
+
+@app.on_event("shutdown")
+def stop_monitoring_jobs():
+    stop_job_monitor()
+
+@app.on_event("shutdown")
+async def close_chatbot_connections():
+    await close_chatbot_client()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
+
 # Authentication endpoints
 # Update your login endpoint function in main.py
 @app.post("/token", tags=["authentication"])
@@ -78,7 +122,7 @@ async def logout(response: Response):
     
 
 @app.get("/users/me", tags=["authentication"])
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user_async)):
     return {
         "username": current_user.username,
         "email": current_user.email,
@@ -92,6 +136,25 @@ async def root():
     return {"message": "Server is running"}
 
 # Data management endpoints
+def _spool_chunk(spool, content_hash, chunk: bytes):
+    content_hash.update(chunk)
+    spool.write(chunk)
+
+async def spool_upload(file: UploadFile):
+    """Copy an uploaded file to a temporary file in fixed-size chunks, return its path and SHA-256"""
+    content_hash = hashlib.sha256()
+    # File I/O runs in the threadpool so a slow disk doesn't stall the event loop
+    spool = await run_in_threadpool(tempfile.NamedTemporaryFile, delete=False, suffix=".csv")
+    try:
+        while True:
+            chunk = await file.read(settings.UPLOAD_SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            await run_in_threadpool(_spool_chunk, spool, content_hash, chunk)
+    finally:
+        await run_in_threadpool(spool.close)
+    return spool.name, content_hash.hexdigest()
+
 # Update the upload-csv endpoint
 @app.post("/upload-csv/", tags=["data"])
 async def upload_csv_files(
@@ -100,26 +163,42 @@ async def upload_csv_files(
     current_user: User = Depends(is_hr)
 ):
     """Upload multiple CSV files and process them in the background."""
+    # Refuse the whole upload up front rather than starting unbounded work
+    executor = get_ingest_executor()
+    if executor.available_slots() < len(files):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Ingest queue is full, {executor.available_slots()} slots free for {len(files)} files. Try again later.",
+            headers={"Retry-After": "30"}
+        )
+    
     results = []
     processor = CSVProcessor(db)
     csv_job_ids = []
+    batch_id = str(uuid.uuid4())
     
     # Process each file in the background
     for file in files:
         try:
-            # Read file content
-            contents = await file.read()
+            # Spool the upload to disk instead of holding it in memory
+            file_path, content_hash = await spool_upload(file)
             
             # Start background processing and get job ID
-            job_result = processor.process_csv_async(contents, file.filename)
+            job_result = processor.process_csv_async(file_path, file.filename, content_hash, batch_id)
             csv_job_ids.append(job_result["job_id"])
             
             results.append({
                 "filename": file.filename,
-                "status": "processing",
+                "status": job_result["status"],
                 "job_id": job_result["job_id"]
             })
             
+        except IngestQueueFull as e:
+            results.append({
+                "filename": file.filename,
+                "status": "queue_full",
+                "message": str(e)
+            })
         except Exception as e:
             logger.error(f"Error processing file {file.filename}: {str(e)}")
             results.append({
@@ -129,7 +208,6 @@ async def upload_csv_files(
             })
     
     # Start user creation AFTER all CSV files are processed (in background)
-    batch_id = str(uuid.uuid4())
     user_job = processor.queue_user_creation_after_csv_jobs(csv_job_ids, batch_id)
     
     # Return immediately with job IDs
@@ -173,7 +251,10 @@ async def create_users_async(
 ):
     """Start background job to create users from all employee IDs"""
     processor = CSVProcessor(db)
-    result = processor.create_users_from_employee_ids_async()
+    try:
+        result = processor.create_users_from_employee_ids_async()
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e), headers={"Retry-After": "30"})
     return {
         "message": "User creation started in background",
         "job_id": result["job_id"]
@@ -181,15 +262,19 @@ async def create_users_async(
 
 @app.get("/tables/", tags=["data"])
 async def get_tables(
+    exact: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(is_hr)  # Only HR can see all tables
 ):
     """
     Get the list of available tables and their record counts
+    
+    Counts are maintained counters or planner estimates, pass exact=true to
+    count every table (this also resynchronises the counters).
     """
     try:
         processor = CSVProcessor(db)
-        tables = processor.get_table_info()
+        tables = processor.get_table_info(exact)
         return {"tables": tables}
     except Exception as e:
         logger.error(f"Error getting table information: {str(e)}")
@@ -198,71 +283,70 @@ async def get_tables(
 @app.get("/data/{table_name}", tags=["data"])
 async def get_table_data(
     table_name: str, 
-    limit: Optional[int] = None,  # Changed from default 100 to Optional with default None
-    offset: int = 0,
+    limit: Optional[int] = Query(None, ge=1),  # None returns all records
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    exact: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    fields: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    sort: Optional[str] = Query(None, pattern="^-?[a-z_]+$"),
     db: Session = Depends(get_db),
     current_user: User = Depends(is_hr)  # Only HR can access all data
 ):
     """
-    Get data from a specific table with pagination support
+    Get data from a specific table with filtering, sorting and cursor pagination
     
     Parameters:
     - table_name: Name of the table to fetch data from
     - limit: Maximum number of records to return (None for all records)
-    - offset: Number of records to skip (default: 0)
+    - cursor: next_cursor from the previous page, pages continue after its last row
+    - offset: Number of records to skip when no cursor is given (slow on deep pages)
+    - include_total: Also return the number of matching records (default: false)
+    - exact: Count the table instead of using its row counter when include_total is set
+    - format: json for a page, ndjson or csv to stream the whole table
+    - fields: Comma separated columns to return, id is always included
+    - employee_id: Only rows for this employee
+    - date_from / date_to: Inclusive range on the table's date column
+    - min_score / max_score: Inclusive range on the table's score column
+    - sort: Column to sort by, prefix with - for descending (default: id)
+    
+    The users table only lists employee accounts.
     """
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    filters = {
+        "employee_id": employee_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "min_score": min_score,
+        "max_score": max_score
+    }
     try:
         processor = CSVProcessor(db)
-        
-        # Special handling for users table to filter out HR accounts
-        if table_name.lower() == "users":
-            # Get all employee users with explicit ordering
-            query = db.query(User).filter(User.role == UserRole.EMPLOYEE).order_by(User.id)
-            
-            # Get total count for pagination info
-            total_count = query.count()
-            
-            # Apply pagination only if limit is specified
-            if limit is not None:
-                users = query.offset(offset).limit(limit).all()
-            else:
-                users = query.offset(offset).all()  # No limit, fetch all records
-            
-            # Convert to dictionaries
-            filtered_data = [user.__dict__ for user in users]
-            
-            return {
-                "data": filtered_data,
-                "pagination": {
-                    "total": total_count,
-                    "limit": limit,
-                    "offset": offset,
-                    "has_more": limit is not None and (offset + limit) < total_count
-                }
-            }
-        else:
-            # For all other tables, use the standard processor with pagination
-            # Pass None to get_table_data to indicate no limit
-            data = processor.get_table_data(table_name, limit, offset)
-            total_count = processor.get_table_count(table_name)
-            
-            return {
-                "data": data,
-                "pagination": {
-                    "total": total_count,
-                    "limit": limit,
-                    "offset": offset,
-                    "has_more": limit is not None and (offset + limit) < total_count
-                }
-            }
+        if format != "json":
+            media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+            return StreamingResponse(
+                processor.stream_table(table_name, format, field_list, filters, sort),
+                media_type=media_type,
+                headers={"Content-Disposition": f'attachment; filename="{table_name}.{format}"'}
+            )
+        page = processor.get_table_data(table_name, limit, offset, cursor, include_total, field_list, filters, sort, exact)
+        return Response(content=dumps(page), media_type="application/json")
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting data from {table_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/employee/data", tags=["employee"])
 async def get_employee_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Any authenticated user
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)  # Any authenticated user
 ):
     """
     Get data for the logged-in employee
@@ -274,44 +358,133 @@ async def get_employee_data(
         )
     
     try:
-        # Get employee data from various tables
-        processor = CSVProcessor(db)
-        
-        # Get data for each table filtered by employee ID
-        return {
-            "employee_id": current_user.employee_id,
-            "activities": processor.get_employee_data("activity_tracker", current_user.employee_id),
-            "mood": processor.get_employee_data("vibe_meter", current_user.employee_id),
-            "leaves": processor.get_employee_data("leave_tracker", current_user.employee_id),
-            "performance": processor.get_employee_data("performance_tracker", current_user.employee_id),
-            "rewards": processor.get_employee_data("rewards_tracker", current_user.employee_id)
-        }
+        # All five tables in one query, cached per employee until they are written to
+        profile = await get_employee_profile_async(db, current_user.employee_id)
+        return Response(content=profile, media_type="application/json")
     except Exception as e:
         logger.error(f"Error getting employee data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
+def report_response(request: Request, db: Session, report_type: str, params: tuple, build):
+    """Serve a report from the versioned cache, or a 304 when the client's copy is still current"""
+    etag, body = cached_report(db, report_type, params, build, request.headers.get("if-none-match"))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/report/collective", tags=["report"])
-async def get_collective_report(db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
-    report = generate_collective_report(db)
-    return {"report": report}
+async def get_collective_report(request: Request, db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
+    try:
+        return report_response(request, db, "collective", (), lambda: generate_collective_report(db))
+    except SummaryNotBuilt as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
 @app.post("/report/employee", tags=["report"])
-async def get_employee_report(payload: dict = Body(...), db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
-    report = generate_individual_report(db, payload["employee_id"])
-    return {"report": report}
+async def get_employee_report(request: Request, payload: dict = Body(...), db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
+    employee_id = payload["employee_id"]
+    return report_response(request, db, "employee", (employee_id,), lambda: generate_individual_report(db, employee_id))
+
+@app.post("/report/employees", tags=["report"])
+async def get_employee_reports(payload: dict = Body(...), db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
+    """
+    Stream individual reports for a list of employee IDs or for a department
+    as NDJSON, one {"employee_id", "report"} object per line
+    """
+    employee_ids = payload.get("employee_ids")
+    if employee_ids is None and payload.get("department"):
+        employee_ids = department_employee_ids(db, payload["department"])
+    if not isinstance(employee_ids, list) or not all(isinstance(employee_id, str) for employee_id in employee_ids):
+        raise HTTPException(status_code=400, detail="Provide employee_ids as a list of strings or a department")
+    return StreamingResponse(
+        stream_individual_reports(employee_ids, settings.REPORT_BATCH_SIZE),
+        media_type="application/x-ndjson"
+    )
 
 @app.post("/report/selective", tags=["report"])
-async def get_employee_report(payload: dict = Body(...),  db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
+async def get_employee_report(request: Request, payload: dict = Body(...),  db: Session = Depends(get_db), current_user: User = Depends(is_hr)):
     employee_ids: List[str] = payload["employee_ids"]
-    report = generate_selective_report(db, employee_ids)
-    return {"report": report}
+    # The report does not depend on the order or repetition of the IDs
+    key = tuple(sorted(set(employee_ids)))
+    return report_response(request, db, "selective", key, lambda: generate_selective_report(db, employee_ids))
+
+@app.get("/analytics/timeseries", tags=["report"])
+def get_metric_timeseries(
+    request: Request,
+    metric: str,
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    aggregate: str = Query("avg", pattern="^(avg|sum|count)$"),
+    window: Optional[int] = Query(None, ge=1, le=365),
+    points: Optional[int] = Query(None, ge=3, le=10000),
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(is_hr)
+):
+    """
+    Trend of a metric per day, week or month
+    
+    Parameters:
+    - metric: mood_score, work_hours, teams_messages_sent, emails_sent, meetings_attended or rating
+    - bucket: Length of each bucket (default: week)
+    - aggregate: avg, sum or count of the values in a bucket (default: avg)
+    - window: Rolling window in buckets
+    - points: Maximum points returned, longer series are downsampled with LTTB
+    - department / employee_id: Only rows for these employees
+    - date_from / date_to: Inclusive date range
+    """
+    max_points = points or settings.TIMESERIES_MAX_POINTS
+    params = (metric, bucket, aggregate, window, max_points, department, employee_id, date_from, date_to)
+    try:
+        return report_response(request, db, "timeseries", params, lambda: metric_timeseries(
+            db, metric, bucket, aggregate, window, max_points, employee_id, department, date_from, date_to
+        ))
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/risk", tags=["report"])
+def get_risk_ranking(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    department: Optional[str] = None,
+    min_score: Optional[float] = Query(None, ge=0, le=100),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(is_hr)
+):
+    """
+    Employees ranked by composite risk score, highest first
+    
+    Parameters:
+    - limit: Employees per page
+    - cursor: next_cursor from the previous page
+    - department: Only employees of this department
+    - min_score: Only employees scoring at least this much (0-100)
+    - include_total: Also return the number of matching employees
+    
+    Scores are kept up to date by the write paths and read from the employee_risk table.
+    """
+    try:
+        page = ranked_risk(db, limit, cursor, department, min_score, include_total)
+        return Response(content=dumps(page), media_type="application/json")
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/store", tags=["report"])
+async def get_analytics_store_stats(current_user: User = Depends(is_hr)):
+    """Footprint and freshness of the in-process analytics store"""
+    if analytics_store is None:
+        return {"enabled": False, "disabled_reason": "ANALYTICS_STORE_ENABLED is not set"}
+    return analytics_store.stats()
 
 # Chatbot endpoints
 @app.post("/start_chat", response_model=ChatResponse, tags=["chat"])
 async def start_chat(
     request: ChatStartRequest = Body(default=None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Start a new chat session."""
     # Use employee_id from authenticated user if not specified
@@ -335,7 +508,7 @@ async def start_chat(
     try:
         # First try with real implementation
         chat_service = ChatService(db)
-        result = chat_service.start_chat(employee_id)
+        result = await chat_service.start_chat(employee_id)
         
         return ChatResponse(
             session_id=result["session_id"],
@@ -356,14 +529,15 @@ async def start_chat(
 @app.post("/chat", response_model=ChatResponse, tags=["chat"])
 async def process_answer(
     request: ChatMessageRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Process a chat message and return the next question or final analysis."""
     try:
         # First try with real implementation
         chat_service = ChatService(db)
-        result = chat_service.process_message(request.session_id, request.message)
+        result = await chat_service.process_message(request.session_id, request.message, background_tasks)
         
         return ChatResponse(
             session_id=result["session_id"],
@@ -421,8 +595,8 @@ async def process_answer(
 async def get_chat_history(
     employee_id: Optional[str] = None,
     chat_date: Optional[date] = Query(None, description="Filter chat history by date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get chat history for the current user or specified employee (HR only)."""
     # Use query param if provided, otherwise use current user's employee_id
@@ -443,7 +617,7 @@ async def get_chat_history(
     
     try:
         chat_service = ChatService(db)
-        messages = chat_service.get_chat_history(target_employee_id, chat_date)
+        messages = await chat_service.get_chat_history(target_employee_id, chat_date)
         
         # Return the messages directly without any transformation
         return {"messages": messages}
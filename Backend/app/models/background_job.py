@@ -1,9 +1,11 @@
 import enum
-from sqlalchemy import Column, String, DateTime, Enum
+from sqlalchemy import Column, String, DateTime, Enum, Integer, JSON
 from app.core.database import Base
 
 class JobStatus(str, enum.Enum):
     PENDING = "pending"
+    QUEUED = "queued"
+    WAITING = "waiting"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
@@ -17,4 +19,21 @@ class BackgroundJob(Base):
     status = Column(Enum(JobStatus), default=JobStatus.PENDING, index=True)
     message = Column(String, nullable=True)
     start_time = Column(DateTime, nullable=False)
-    end_time = Column(DateTime, nullable=True)
\ No newline at end of file
+    end_time = Column(DateTime, nullable=True, index=True)
+    updated_at = Column(DateTime, nullable=True)
+    
+    # Ingest details and progress
+    filename = Column(String, nullable=True)
+    table_name = Column(String, nullable=True)
+    batch_id = Column(String, nullable=True, index=True)
+    rows_processed = Column(Integer, default=0)
+    bytes_read = Column(Integer, default=0)
+    bytes_total = Column(Integer, nullable=True)
+    result = Column(JSON, nullable=True)
+
+class JobDependency(Base):
+    """Edge in the job graph: job_id may only start once depends_on_id has finished"""
+    __tablename__ = "job_dependencies"
+    
+    job_id = Column(String, primary_key=True)
+    depends_on_id = Column(String, primary_key=True, index=True)
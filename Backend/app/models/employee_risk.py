@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Integer, Float, Date
+from app.core.database import Base
+
+class EmployeeRisk(Base):
+    """Composite attention score per employee, recomputed by the write paths after ingest"""
+    __tablename__ = "employee_risk"
+    
+    employee_id = Column(String, primary_key=True)
+    score = Column(Float, nullable=False, index=True)  # 0 (no concern) to 100
+    avg_work_hours = Column(Float, nullable=True)  # Over the recent window
+    leaves = Column(Integer, nullable=False, default=0)  # Leaves started in the leave window
+    last_rating = Column(Float, nullable=True)
+    avg_mood = Column(Float, nullable=True)  # Over the recent window
+    days_since_reward = Column(Integer, nullable=True)  # None when never rewarded
+    as_of = Column(Date, nullable=True)  # The employee's latest tracker date, their windows end here
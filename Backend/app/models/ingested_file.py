@@ -0,0 +1,24 @@
+import enum
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Enum
+from app.core.database import Base
+
+class IngestStatus(str, enum.Enum):
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+
+class IngestedFile(Base):
+    """Registry of uploaded CSV files, keyed by the SHA-256 of their content"""
+    __tablename__ = "ingested_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    filename = Column(String, nullable=True)
+    table_name = Column(String, nullable=True)
+    records_added = Column(Integer, nullable=True)
+    ingested_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Claim on the content while a job ingests it, only DONE files are skipped
+    status = Column(Enum(IngestStatus), default=IngestStatus.IN_PROGRESS, nullable=False)
+    job_id = Column(String, nullable=True)
@@ -4,6 +4,9 @@ from app.core.database import Base
 class LeaveTracker(Base):
     __tablename__ = "leave_tracker"
     
+    # A leave is identified by who took it, when it starts and its type
+    NATURAL_KEY = ("employee_id", "start_date", "leave_type")
+    
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, index=True)
     start_date = Column(Date, index=True)  # For Leave_Start_Date
@@ -4,9 +4,12 @@ from app.core.database import Base
 class OnboardingTracker(Base):
     __tablename__ = "onboarding_tracker"
     
+    # One onboarding per employee per joining date, rehired employees join again
+    NATURAL_KEY = ("employee_id", "joining_date")
+    
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, index=True)
-    joining_date = Column(Date)  # Make sure this field is present to fix the error
+    joining_date = Column(Date, index=True)  # Make sure this field is present to fix the error
     onboarding_feedback = Column(Text, nullable=True)
     mentor_assigned = Column(String, nullable=True)
     initial_training_completed = Column(String, nullable=True)  # Changed to String since CSV likely has text values
\ No newline at end of file
@@ -4,6 +4,9 @@ from app.core.database import Base
 class PerformanceTracker(Base):
     __tablename__ = "performance_tracker"
     
+    # Employees get several reviews in the same period, only the whole review identifies a row
+    NATURAL_KEY = ("employee_id", "review_date", "rating", "comments", "manager_id")
+    
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, index=True)
     review_date = Column(Date, index=True)  # For Review_Period
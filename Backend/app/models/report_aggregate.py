@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Integer, Float
+from app.core.database import Base
+
+class ReportAggregate(Base):
+    """Running totals behind the collective report, updated by the write paths"""
+    __tablename__ = "report_aggregates"
+    
+    metric = Column(String, primary_key=True)
+    key = Column(String, primary_key=True, default="")  # Employee ID or category for per-key metrics
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
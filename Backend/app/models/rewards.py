@@ -4,6 +4,9 @@ from app.core.database import Base
 class RewardsTracker(Base):
     __tablename__ = "rewards_tracker"
     
+    # The same award can only be given to an employee once per day
+    NATURAL_KEY = ("employee_id", "date", "reward_type")
+    
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, index=True)
     date = Column(Date, index=True)  # For Award_Date
@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime
+from app.core.database import Base
+
+class TableStats(Base):
+    """Row counters kept up to date by the write paths so counts do not need a table scan"""
+    __tablename__ = "table_stats"
+    
+    table_name = Column(String, primary_key=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class DataVersion(Base):
+    """Per-table change counters, bumped by every write that can change what the reports show"""
+    __tablename__ = "data_versions"
+    
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
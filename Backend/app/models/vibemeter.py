@@ -4,6 +4,9 @@ from app.core.database import Base
 class VibeMeter(Base):
     __tablename__ = "vibe_meter"
     
+    # One mood response per employee per day
+    NATURAL_KEY = ("employee_id", "date")
+    
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, index=True)
     date = Column(Date, index=True)
@@ -0,0 +1,212 @@
+"""
+Row-by-row implementations of the reports.
+
+These load every row into Python and aggregate there. They are kept only
+to check the versions in report.py against, see report_test2.
+"""
+from typing import List
+from sqlalchemy.orm import Session
+import pandas as pd
+from app.models.activity import ActivityTracker
+from app.models.employee import Employee
+from app.models.leave import LeaveTracker
+from app.models.onboarding import OnboardingTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.user import User
+from app.models.vibemeter import VibeMeter
+from app.services.row_serializer import get_serializer
+
+def legacy_individual_report(db: Session, employee_id: str):
+    user = get_serializer(User).first(db, User.employee_id == employee_id)
+    employee = get_serializer(Employee).first(db, Employee.employee_id == employee_id)
+    if not employee and not user:
+        return {"error": f"No data found for Employee ID {employee_id}"}
+
+    activity_rows = get_serializer(ActivityTracker)
+    activities = activity_rows.fetch(db, ActivityTracker.employee_id == employee_id)
+    leaves = get_serializer(LeaveTracker).fetch(db, LeaveTracker.employee_id == employee_id)
+    onboarding = get_serializer(OnboardingTracker).first(db, OnboardingTracker.employee_id == employee_id)
+    performance = get_serializer(PerformanceTracker).first(db, PerformanceTracker.employee_id == employee_id, order_by=PerformanceTracker.review_date.desc())
+    rewards = get_serializer(RewardsTracker).fetch(db, RewardsTracker.employee_id == employee_id, order_by=RewardsTracker.date.desc())
+    vibe = get_serializer(VibeMeter).first(db, VibeMeter.employee_id == employee_id, order_by=VibeMeter.date.desc())
+    
+    activity_df = pd.DataFrame(activities, columns=activity_rows.names)
+    total_messages = activity_df['teams_messages_sent'].sum() if not activity_df.empty else 0
+    total_emails = int(activity_df['emails_sent'].sum()) if not activity_df.empty else 0
+    total_meetings = int(activity_df['meetings_attended'].sum()) if not activity_df.empty else 0
+    total_work_hours = activity_df['work_hours'].sum() if not activity_df.empty else 0
+
+    total_leaves = len(leaves)
+    
+    onboarding_feedback = onboarding.onboarding_feedback if onboarding else "N/A"
+    training_completed = onboarding.initial_training_completed if onboarding else "No"
+    
+    last_rating = performance.rating if performance else 0
+    manager_feedback = performance.comments if performance else "No feedback available"
+    
+    total_rewards = len(rewards)
+    recent_reward = {
+        "Date": rewards[0].date.strftime("%Y-%m-%d") if rewards else "N/A",
+        "Type": rewards[0].reward_type if rewards else "N/A",
+        "Points": rewards[0].amount if rewards else 0
+    }
+    
+    recent_mood_score = vibe.mood_score if vibe else 0
+    mood_comment = vibe.comments if vibe else "No comments"
+    
+    report = {
+        "Employee ID": employee.employee_id,
+        "Name": employee.name,
+        "Department": employee.department,
+        "Position": employee.position,
+        "Manager ID": employee.manager_id,
+        "Joining Date": employee.join_date.strftime("%Y-%m-%d") if employee.join_date else "N/A",
+        "Last Chat Date": user.last_chat_date,
+        "Current Mood": user.current_mood,
+        "Hr Escalation": user.hr_escalation,
+        "Escalation Reason": user.escalation_reason,
+        "Total Messages Sent": total_messages,
+        "Total Emails Sent": total_emails,
+        "Total Meetings Attended": total_meetings,
+        "Total Work Hours": total_work_hours,
+        "Total Leaves Taken": total_leaves,
+        "Onboarding Feedback": onboarding_feedback,
+        "Initial Training Completed": training_completed,
+        "Last Performance Rating": last_rating,
+        "Manager Feedback": manager_feedback,
+        "Total Rewards Earned": total_rewards,
+        "Recent Reward": recent_reward,
+        "Recent Mood Score": recent_mood_score,
+        "Mood Comment": mood_comment,
+    }
+    
+    return report
+
+def legacy_collective_report(db: Session):
+    activity_rows = get_serializer(ActivityTracker)
+    users = get_serializer(User).fetch(db, User.hr_escalation == 1)
+    employees = get_serializer(Employee).fetch(db)
+    activities = activity_rows.fetch(db)
+    leaves = get_serializer(LeaveTracker).fetch(db)
+    onboarding = get_serializer(OnboardingTracker).fetch(db)
+    performance = get_serializer(PerformanceTracker).fetch(db)
+    rewards = get_serializer(RewardsTracker).fetch(db)
+    vibes = get_serializer(VibeMeter).fetch(db, order_by=VibeMeter.id)
+    
+    total_attention_employees = len(users)
+    total_employees = len(employees)
+    activity_df = pd.DataFrame(activities, columns=activity_rows.names)
+    avg_work_hours = activity_df.groupby('employee_id')['work_hours'].sum().mean() if not activity_df.empty else 0
+    total_messages = activity_df['teams_messages_sent'].sum() if not activity_df.empty else 0
+    total_emails = int(activity_df['emails_sent'].sum()) if not activity_df.empty else 0
+    total_meetings = int(activity_df['meetings_attended'].sum()) if not activity_df.empty else 0
+    total_leaves = len(leaves)
+    
+    onboarding_moods = [o.onboarding_feedback for o in onboarding if o.onboarding_feedback is not None]
+    
+    mood_counts = {
+        "Poor": 0,
+        "Average": 0,
+        "Good": 0,
+        "Excellent": 0,
+        "Total": len(onboarding_moods)
+    }
+    
+    for mood in onboarding_moods:
+        if mood in mood_counts:
+            mood_counts[mood] += 1
+        
+    performance_scores = [p.rating for p in performance if p.rating is not None]
+    avg_performance_rating = sum(performance_scores) / len(performance_scores) if performance_scores else "N/A"
+    
+    total_rewards_given = len(rewards)
+    reward_types = [r.reward_type for r in rewards]
+    most_common_reward = max(set(reward_types), key=reward_types.count) if reward_types else "N/A"
+    
+    mood_scores = [v.mood_score for v in vibes if v.mood_score is not None]
+    avg_mood_score = sum(mood_scores) / len(mood_scores) if mood_scores else "N/A"
+    mood_comments = [v.comments for v in vibes if v.comments]
+    
+    report = {
+        "Total Attention Employees": total_attention_employees,
+        "Total Employees": total_employees,
+        "Average Work Hours Per Employee": avg_work_hours,
+        "Total Messages Sent": total_messages,
+        "Total Emails Sent": total_emails,
+        "Total Meetings Attended": total_meetings,
+        "Total Leaves Taken": total_leaves,
+        "Onboarding Moods": mood_counts,
+        "Average Performance Rating": avg_performance_rating,
+        "Total Rewards Given": total_rewards_given,
+        "Most Common Reward Type": most_common_reward,
+        "Overall Mood Score": avg_mood_score,
+        "Frequent Mood Comments": mood_comments[:5]
+    }
+    
+    return report
+
+def legacy_selective_report(db: Session, employee_ids: List[str]):
+    activity_rows = get_serializer(ActivityTracker)
+    users = get_serializer(User).fetch(db, User.employee_id.in_(employee_ids), User.hr_escalation == 1)
+    employees = get_serializer(Employee).fetch(db, Employee.employee_id.in_(employee_ids))
+    activities = activity_rows.fetch(db, ActivityTracker.employee_id.in_(employee_ids))
+    leaves = get_serializer(LeaveTracker).fetch(db, LeaveTracker.employee_id.in_(employee_ids))
+    onboarding = get_serializer(OnboardingTracker).fetch(db, OnboardingTracker.employee_id.in_(employee_ids))
+    performance = get_serializer(PerformanceTracker).fetch(db, PerformanceTracker.employee_id.in_(employee_ids))
+    rewards = get_serializer(RewardsTracker).fetch(db, RewardsTracker.employee_id.in_(employee_ids))
+    # Unordered originally, SQLite then returned rows in employee_id index order
+    vibes = get_serializer(VibeMeter).fetch(db, VibeMeter.employee_id.in_(employee_ids), order_by=VibeMeter.id)
+    
+    total_attention_employees = len(users)
+    total_employees = len(employees)
+    activity_df = pd.DataFrame(activities, columns=activity_rows.names)
+    avg_work_hours = activity_df.groupby('employee_id')['work_hours'].sum().mean() if not activity_df.empty else 0
+    total_messages = activity_df['teams_messages_sent'].sum() if not activity_df.empty else 0
+    total_emails = int(activity_df['emails_sent'].sum()) if not activity_df.empty else 0
+    total_meetings = int(activity_df['meetings_attended'].sum()) if not activity_df.empty else 0
+    total_leaves = len(leaves)
+    
+    onboarding_moods = [o.onboarding_feedback for o in onboarding if o.onboarding_feedback is not None]
+    
+    mood_counts = {
+        "Poor": 0,
+        "Average": 0,
+        "Good": 0,
+        "Excellent": 0,
+        "Total": len(onboarding_moods)
+    }
+    
+    for mood in onboarding_moods:
+        if mood in mood_counts:
+            mood_counts[mood] += 1
+
+    
+    performance_scores = [p.rating for p in performance if p.rating is not None]
+    avg_performance_rating = sum(performance_scores) / len(performance_scores) if performance_scores else "N/A"
+    
+    total_rewards_given = len(rewards)
+    reward_types = [r.reward_type for r in rewards]
+    most_common_reward = max(set(reward_types), key=reward_types.count) if reward_types else "N/A"
+    
+    mood_scores = [v.mood_score for v in vibes if v.mood_score is not None]
+    avg_mood_score = sum(mood_scores) / len(mood_scores) if mood_scores else "N/A"
+    mood_comments = [v.comments for v in vibes if v.comments]
+    
+    report = {
+        "Total Attention Employees": total_attention_employees,
+        "Total Employees": total_employees,
+        "Average Work Hours Per Employee": avg_work_hours,
+        "Total Messages Sent": total_messages,
+        "Total Emails Sent": total_emails,
+        "Total Meetings Attended": total_meetings,
+        "Total Leaves Taken": total_leaves,
+        "Onboarding Moods": mood_counts,
+        "Average Performance Rating": avg_performance_rating,
+        "Total Rewards Given": total_rewards_given,
+        "Most Common Reward Type": most_common_reward,
+        "Overall Mood Score": avg_mood_score,
+        "Frequent Mood Comments": mood_comments[:5]
+    }
+    
+    return report
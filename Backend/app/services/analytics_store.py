@@ -0,0 +1,297 @@
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import Date, Float, Integer
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.activity import ActivityTracker
+from app.models.leave import LeaveTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.table_stats import TableStats
+from app.models.vibemeter import VibeMeter
+from app.services.data_versions import get_data_versions
+from app.services.row_counts import exact_row_count
+from app.services.row_serializer import get_serializer
+
+logger = logging.getLogger(__name__)
+
+STORE_MODELS = {model.__tablename__: model for model in (
+    ActivityTracker, VibeMeter, LeaveTracker, PerformanceTracker, RewardsTracker
+)}
+
+
+def _column_array(column, values: List[Any]):
+    """NumPy array and NULL mask for one column, NULLs stored as 0, NaN, NaT or None"""
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if isinstance(column.type, Integer):
+        array = np.array([0 if value is None else value for value in values], dtype=np.int64)
+    elif isinstance(column.type, Float):
+        array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    elif isinstance(column.type, Date):
+        array = np.array([np.datetime64("NaT") if value is None else value for value in values], dtype="datetime64[D]")
+    else:
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array, nulls
+
+
+class ColumnTable:
+    """
+    One tracker table as NumPy column arrays.
+
+    Rows are sorted by employee_id and then id, so each employee's rows are
+    the contiguous slice offsets[i]:offsets[i + 1] for employees[i]. Rows
+    without an employee ID are not kept, no report can select them.
+    """
+
+    def __init__(self, model, values: Dict[str, np.ndarray], nulls: Dict[str, np.ndarray], rows_seen: int, max_id: int):
+        order = np.argsort(values["employee_id"], kind="stable")
+        self.model = model
+        self.values = {name: array[order] for name, array in values.items()}
+        self.nulls = {name: array[order] for name, array in nulls.items()}
+        self.employees, starts = np.unique(self.values["employee_id"], return_index=True)
+        self.offsets = np.append(starts, len(order)).astype(np.int64)
+        # Every row read so far, including rows without an employee ID
+        self.rows_seen = rows_seen
+        self.max_id = max_id
+        # Tables are immutable once built, so the size is measured once
+        self.nbytes = self._measure()
+
+    @classmethod
+    def from_rows(cls, model, rows: List[Any], previous: Optional["ColumnTable"] = None) -> "ColumnTable":
+        """Build from rows ordered by id, appended after the rows of a previous table when given"""
+        serializer = get_serializer(model)
+        kept = [row for row in rows if row.employee_id is not None]
+        columns = list(zip(*kept)) if kept else [()] * len(serializer.columns)
+        values, nulls = {}, {}
+        for column, column_values in zip(serializer.columns, columns):
+            array, null_mask = _column_array(column, list(column_values))
+            if previous is not None:
+                array = np.concatenate([previous.values[column.name], array])
+                null_mask = np.concatenate([previous.nulls[column.name], null_mask])
+            values[column.name], nulls[column.name] = array, null_mask
+        max_id = max((row.id for row in rows), default=previous.max_id if previous else 0)
+        rows_seen = len(rows) + (previous.rows_seen if previous else 0)
+        return cls(model, values, nulls, rows_seen, max_id)
+
+    def _measure(self) -> int:
+        total = self.employees.nbytes + self.offsets.nbytes
+        for name, array in self.values.items():
+            total += array.nbytes + self.nulls[name].nbytes
+            if array.dtype == object:
+                total += sum(sys.getsizeof(value) for value in array if value is not None)
+        return total
+
+    def span(self, employee_id: str):
+        """(start, stop) of an employee's rows, an empty span when there are none"""
+        position = np.searchsorted(self.employees, employee_id)
+        if position < len(self.employees) and self.employees[position] == employee_id:
+            return int(self.offsets[position]), int(self.offsets[position + 1])
+        return 0, 0
+
+    def row_employees(self) -> np.ndarray:
+        """Position in employees of every row's employee, for grouping with bincount or reduceat"""
+        return np.repeat(np.arange(len(self.employees)), np.diff(self.offsets))
+
+    def positions(self, employee_ids: Iterable[str]) -> np.ndarray:
+        """Row positions of several employees, each employee's rows in id order"""
+        spans = [self.span(employee_id) for employee_id in dict.fromkeys(employee_ids)]
+        return np.concatenate([np.arange(start, stop) for start, stop in spans] or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+
+    def row(self, position: int):
+        """Row at a position with plain Python values, attribute access like a database row"""
+        return SimpleNamespace(**{
+            name: None if self.nulls[name][position] else array[position].item() if array.dtype != object else array[position]
+            for name, array in self.values.items()
+        })
+
+    def latest(self, employee_id: str, date_column: str):
+        """
+        Row with the latest date for an employee, the lowest id among ties,
+        and the first row when no date is set (NULL dates sort last)
+        """
+        start, stop = self.span(employee_id)
+        if start == stop:
+            return None
+        missing = self.nulls[date_column][start:stop]
+        if missing.all():
+            return self.row(start)
+        dates = self.values[date_column][start:stop].astype(np.int64)
+        dates[missing] = np.iinfo(np.int64).min
+        return self.row(start + int(np.argmax(dates)))
+
+    def column_sum(self, name: str, positions: np.ndarray):
+        """
+        Sum of a column over some rows with the result a pandas column sum
+        gives: 0 when all are NULL, numpy int64 for complete integer
+        columns, numpy float64 with NULLs added as 0 otherwise
+        """
+        nulls = self.nulls[name][positions]
+        if nulls.all():
+            return 0
+        values = self.values[name][positions]
+        if values.dtype == np.int64 and not nulls.any():
+            return values.sum()
+        return np.where(nulls, 0.0, values.astype(np.float64)).sum()
+
+
+class AnalyticsStore:
+    """
+    In-process column store of the tracker tables behind the reports.
+
+    Tables are stamped with the data version they were loaded at and are
+    brought up to date whenever a version moved, so writes from any worker
+    are seen. Append-only changes are loaded incrementally as the rows past
+    the highest loaded id, checked against the maintained row counter, and
+    anything else reloads the table. Once the footprint passes the memory
+    budget the store switches itself off and reports go back to SQL.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.tables: Dict[str, ColumnTable] = {}
+        self.versions: Dict[str, int] = {}
+        self.refreshes = {"full": 0, "incremental": 0}
+        self.disabled_reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, db: Session) -> Optional[Dict[str, ColumnTable]]:
+        """Bring every table up to date and return them, None when the store is switched off"""
+        if self.disabled_reason:
+            return None
+        versions = get_data_versions(db, STORE_MODELS)
+        with self._lock:
+            for table_name, version in versions.items():
+                if self.versions.get(table_name) != version or table_name not in self.tables:
+                    self._refresh(db, table_name, version)
+            footprint = self.footprint()
+            if footprint > self.max_bytes:
+                self.disabled_reason = f"Footprint {footprint} bytes is over the budget of {self.max_bytes} bytes"
+                self.tables.clear()
+                logger.warning(f"Analytics store switched off: {self.disabled_reason}")
+                return None
+            return dict(self.tables)
+
+    def refresh(self, db: Session, table_name: str) -> None:
+        """Catch a table up after a committed write, so the next report does not have to"""
+        if table_name in STORE_MODELS and not self.disabled_reason and table_name in self.tables:
+            version = get_data_versions(db, [table_name])[table_name]
+            with self._lock:
+                if self.versions.get(table_name) != version:
+                    self._refresh(db, table_name, version)
+
+    def _refresh(self, db: Session, table_name: str, version: int) -> None:
+        model = STORE_MODELS[table_name]
+        serializer = get_serializer(model)
+        started = time.perf_counter()
+        current = self.tables.get(table_name)
+        table = None
+        # Upserts in update mode rewrite rows in place, which only a reload picks up
+        if current is not None and settings.INGEST_UPSERT_MODE != "update":
+            rows = serializer.fetch(db, model.id > current.max_id, order_by=model.id)
+            table = ColumnTable.from_rows(model, rows, previous=current)
+            counter = db.query(TableStats.row_count).filter(TableStats.table_name == table_name).scalar()
+            if counter != table.rows_seen:
+                # Rows committed out of id order or a missing counter, start over
+                table = None
+            else:
+                self.refreshes["incremental"] += 1
+        if table is None:
+            table = ColumnTable.from_rows(model, serializer.fetch(db, order_by=model.id))
+            self.refreshes["full"] += 1
+            if db.query(TableStats.row_count).filter(TableStats.table_name == table_name).scalar() is None:
+                # Incremental refreshes are checked against the counter
+                exact_row_count(db, model)
+        self.tables[table_name] = table
+        self.versions[table_name] = version
+        logger.debug(f"Analytics store loaded {table_name} in {time.perf_counter() - started:.3f}s")
+
+    def footprint(self) -> int:
+        return sum(table.nbytes for table in self.tables.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.disabled_reason is None,
+                "disabled_reason": self.disabled_reason,
+                "footprint_bytes": self.footprint(),
+                "budget_bytes": self.max_bytes,
+                "refreshes": dict(self.refreshes),
+                "tables": {
+                    table_name: {
+                        "rows": int(table.offsets[-1]),
+                        "employees": len(table.employees),
+                        "bytes": table.nbytes,
+                        "data_version": self.versions.get(table_name),
+                    }
+                    for table_name, table in self.tables.items()
+                },
+            }
+
+
+analytics_store = AnalyticsStore(settings.ANALYTICS_STORE_MAX_BYTES) if settings.ANALYTICS_STORE_ENABLED else None
+
+
+def get_store_tables(db: Session) -> Optional[Dict[str, ColumnTable]]:
+    """Current store tables, None when the store is not enabled or switched itself off"""
+    return analytics_store.snapshot(db) if analytics_store is not None else None
+
+
+def refresh_store_table(db: Session, table_name: str) -> None:
+    if analytics_store is not None:
+        analytics_store.refresh(db, table_name)
+
+
+def selection_figures(tables: Dict[str, ColumnTable], employee_ids: List[str]) -> Dict[str, Any]:
+    """Figures of the selective report for a set of employees, computed from the store"""
+    activity = tables[ActivityTracker.__tablename__]
+    positions = activity.positions(employee_ids)
+    hours = np.where(activity.nulls["work_hours"][positions], 0.0, activity.values["work_hours"][positions])
+    # Per-employee sums through reduceat over the start of each employee's run of rows
+    employee_codes = activity.values["employee_id"][positions]
+    starts = np.flatnonzero(np.r_[True, employee_codes[1:] != employee_codes[:-1]]) if len(positions) else np.empty(0, dtype=np.int64)
+    hours_per_employee = np.add.reduceat(hours, starts) if len(starts) else hours
+
+    messages_nulls = activity.nulls["teams_messages_sent"][positions]
+    messages_recorded = int((~messages_nulls).sum())
+
+    rewards = tables[RewardsTracker.__tablename__]
+    reward_types = Counter(rewards.values["reward_type"][rewards.positions(employee_ids)].tolist())
+
+    performance = tables[PerformanceTracker.__tablename__]
+    ratings = performance.positions(employee_ids)
+    ratings = ratings[~performance.nulls["rating"][ratings]]
+
+    vibes = tables[VibeMeter.__tablename__]
+    vibe_positions = vibes.positions(employee_ids)
+    scores = vibe_positions[~vibes.nulls["mood_score"][vibe_positions]]
+    commented = [
+        position for position in vibe_positions
+        if not vibes.nulls["comments"][position] and vibes.values["comments"][position] != ""
+    ]
+    commented.sort(key=lambda position: vibes.values["id"][position])
+
+    return {
+        "activity_rows": len(positions),
+        "avg_work_hours": float(hours_per_employee.mean()) if len(starts) else None,
+        "messages": int(activity.values["teams_messages_sent"][positions].sum()) if messages_recorded else None,
+        "messages_recorded": messages_recorded,
+        "emails": int(activity.values["emails_sent"][positions].sum()),
+        "meetings": int(activity.values["meetings_attended"][positions].sum()),
+        "leaves": len(tables[LeaveTracker.__tablename__].positions(employee_ids)),
+        "avg_rating": float(performance.values["rating"][ratings].mean()) if len(ratings) else None,
+        "rewards": sum(reward_types.values()),
+        # Ties broken alphabetically like the SQL version
+        "most_common_reward": min(reward_types, key=lambda reward_type: (-reward_types[reward_type], reward_type or ""))
+        if reward_types else "N/A",
+        "avg_mood_score": float(vibes.values["mood_score"][scores].mean()) if len(scores) else None,
+        "mood_comments": [vibes.values["comments"][position] for position in commented[:5]],
+    }
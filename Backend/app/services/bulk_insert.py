@@ -0,0 +1,205 @@
+import io
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import inspect, insert, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Insert behaviours for rows whose natural key already exists
+UPSERT_MODES = ("append", "ignore", "update")
+
+# Natural keys looked up per SELECT when reading rows before an overwrite
+KEY_LOOKUP_BATCH = 500
+
+# Tables whose natural key unique index has been verified in this process
+_natural_key_indexes = set()
+
+
+class MissingNaturalKeyIndex(RuntimeError):
+    """An upsert needs the natural key unique index, which the startup migration has not created"""
+
+
+def is_postgresql(db: Session) -> bool:
+    """Check whether the session is bound to a PostgreSQL database"""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def frame_to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a DataFrame into plain dicts, replacing NaN/NaT with None"""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def _copy_frame(db: Session, table, frame: pd.DataFrame) -> int:
+    """Stream a DataFrame into a PostgreSQL table with COPY FROM STDIN"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{column}"' for column in frame.columns)
+    statement = f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+    # Use the session's own connection so the COPY joins the current transaction
+    raw_connection = db.connection().connection
+    cursor = raw_connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+    return len(frame)
+
+
+def _execute_many(db: Session, table, frame: pd.DataFrame) -> int:
+    """Insert a DataFrame with a single executemany / multi-row INSERT"""
+    records = frame_to_records(frame)
+    if records:
+        db.execute(insert(table), records)
+    return len(records)
+
+
+def bulk_insert_frame(db: Session, model, frame: pd.DataFrame, chunk_size: Optional[int] = None) -> int:
+    """
+    Insert a DataFrame whose columns are model fields in set-based chunks.
+
+    PostgreSQL uses COPY FROM STDIN, every other database uses SQLAlchemy Core
+    executemany. The caller owns the transaction and is expected to commit.
+    """
+    if frame.empty:
+        return 0
+
+    table = model.__table__
+    chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+    writer = _copy_frame if is_postgresql(db) else _execute_many
+
+    rows_inserted = 0
+    for start in range(0, len(frame), chunk_size):
+        rows_inserted += writer(db, table, frame.iloc[start:start + chunk_size])
+
+    return rows_inserted
+
+
+def dialect_insert(db: Session, table):
+    """Return an INSERT construct that supports ON CONFLICT for the session's database"""
+    if is_postgresql(db):
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def natural_key_index_name(table_name: str) -> str:
+    """Name of the unique index on a table's NATURAL_KEY"""
+    return f"uq_{table_name}_natural_key"
+
+
+def require_natural_key_index(db: Session, model) -> None:
+    """
+    Check that the unique index ON CONFLICT needs for a model's NATURAL_KEY exists.
+
+    The index is created, after removing duplicate keys, by
+    sync_natural_key_indexes at startup. This only reads the catalog and
+    leaves the caller's transaction alone.
+    """
+    table = model.__table__
+    if table.name in _natural_key_indexes:
+        return
+
+    index_name = natural_key_index_name(table.name)
+    if index_name not in {index["name"] for index in inspect(db.connection()).get_indexes(table.name)}:
+        raise MissingNaturalKeyIndex(
+            f"{index_name} does not exist, restart the API or run init_db.py with INGEST_UPSERT_MODE="
+            f"{settings.INGEST_UPSERT_MODE} to create it"
+        )
+    _natural_key_indexes.add(table.name)
+
+
+class UpsertResult(NamedTuple):
+    """Rows an upsert wrote, as stored, and the previous versions of the rows it overwrote"""
+    written: List[Dict[str, Any]]
+    replaced: List[Dict[str, Any]]
+
+    @property
+    def inserted(self) -> int:
+        return len(self.written) - len(self.replaced)
+
+
+def _lock_existing(db: Session, table, records: List[Dict[str, Any]], key_columns: Sequence[str]) -> Dict[int, Dict[str, Any]]:
+    """Lock the stored rows matching the records' natural keys and return them by id"""
+    keys = [tuple(record[column] for column in key_columns) for record in records]
+    key = tuple_(*(table.c[column] for column in key_columns))
+    rows = {}
+    # Bounded so the bind parameters stay within SQLite's limit
+    for start in range(0, len(keys), KEY_LOOKUP_BATCH):
+        statement = select(table).where(key.in_(keys[start:start + KEY_LOOKUP_BATCH])).with_for_update()
+        rows.update((row["id"], dict(row)) for row in db.execute(statement).mappings())
+    return rows
+
+
+def upsert_records(db: Session, model, records: List[Dict[str, Any]], key_columns: Sequence[str], mode: str) -> UpsertResult:
+    """
+    Insert records with ON CONFLICT on the natural key.
+
+    "ignore" keeps existing rows untouched, "update" overwrites them but only
+    when at least one column actually changed. New rows are inserted first,
+    then the rows whose key already existed are locked and read before they
+    are overwritten, so the caller can apply the exact change.
+    """
+    if not records:
+        return UpsertResult([], [])
+
+    table = model.__table__
+    statement = dialect_insert(db, table)
+    written = [dict(row) for row in db.execute(
+        statement.on_conflict_do_nothing(index_elements=list(key_columns)).returning(*table.c), records
+    ).mappings()]
+
+    update_columns = [column for column in records[0] if column not in key_columns]
+    if mode == "ignore" or not update_columns or len(written) == len(records):
+        return UpsertResult(written, [])
+
+    # Every other key exists now, lock it so nothing changes between the read and the overwrite
+    existing = _lock_existing(db, table, records, key_columns)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={column: statement.excluded[column] for column in update_columns},
+        where=or_(*[table.c[column].is_distinct_from(statement.excluded[column]) for column in update_columns])
+    )
+    # RETURNING only yields rows that were inserted or actually updated, the rows inserted above are unchanged
+    updated = [dict(row) for row in db.execute(statement.returning(*table.c), records).mappings()]
+    replaced = [existing[row["id"]] for row in updated if row["id"] in existing]
+    return UpsertResult(written + updated, replaced)
+
+
+def upsert_frame(db: Session, model, frame: pd.DataFrame, mode: str,
+                 chunk_size: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """
+    Upsert a DataFrame of model fields on the model's NATURAL_KEY in chunks, see upsert_records.
+
+    Returns the rows written and the previous versions of the overwritten
+    rows, as frames of model fields, and the rows dropped because a later
+    row of the frame repeats their key.
+    """
+    if frame.empty:
+        return pd.DataFrame(), pd.DataFrame(), 0
+
+    key_columns = list(model.NATURAL_KEY)
+    require_natural_key_index(db, model)
+
+    # A statement may not touch the same key twice, keep the last occurrence
+    rows_before = len(frame)
+    frame = frame.drop_duplicates(subset=key_columns, keep="last")
+    duplicates = rows_before - len(frame)
+    if duplicates:
+        logger.warning(f"Dropped {duplicates} rows repeating a {model.__tablename__} natural key within the upload")
+
+    chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+    written, replaced = [], []
+    for start in range(0, len(frame), chunk_size):
+        result = upsert_records(db, model, frame_to_records(frame.iloc[start:start + chunk_size]), key_columns, mode)
+        written.extend(result.written)
+        replaced.extend(result.replaced)
+
+    return pd.DataFrame(written), pd.DataFrame(replaced), duplicates
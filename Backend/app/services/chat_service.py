@@ -4,27 +4,53 @@ import os
 import uuid
 import traceback  # Add this import for stack trace logging
 from datetime import datetime, timezone, timedelta, date
-from typing import Dict, Any, List, Optional
-import requests
+from typing import Dict, Any, List, Optional, Union
+import httpx
 import random  # Add this import for personalized messages
-from fastapi import HTTPException
+from fastapi import BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.config import settings
+from app.core.database import SessionLocal
 from app.models.user import User
+from app.models.vibemeter import VibeMeter
 from app.models.chat import ChatMessage  # Changed from ChatMessageModel
+from app.services.bulk_insert import require_natural_key_index, upsert_records
+from app.services.row_counts import adjust_row_count
+from app.services.report_summary import apply_summary_rows
+from app.services.data_versions import bump_data_version
+from app.services.analytics_store import refresh_store_table
+from app.services.risk_scores import refresh_risk_scores
+from app.services.chatbot_client import get_chatbot_client
 
 logger = logging.getLogger(__name__)
 
 
+def refresh_mood_views(employee_id: str) -> None:
+    """Bring the analytics store and an employee's risk score up to date after a chat mood was saved"""
+    with SessionLocal() as db:
+        try:
+            refresh_store_table(db, VibeMeter.__tablename__)
+        except Exception:
+            logger.exception("Refreshing the analytics store after a chat failed")
+        refresh_risk_scores(db, VibeMeter.__tablename__, [employee_id])
+
+
 class ChatService:
     """Service for handling employee chatbot interactions"""
 
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self, db: Union[Session, AsyncSession]):
+        # With an async session the ORM code below runs through run_sync on its sync facade
+        self.async_db = db if isinstance(db, AsyncSession) else None
+        self.db = db.sync_session if self.async_db is not None else db
+        # Employee whose mood was saved by the last final analysis, refreshed off the event loop
+        self._mood_saved_for = None
 
         # API configuration
         self.endpoints = {
@@ -42,60 +68,126 @@ class ChatService:
             "X-API-Key": self.api_key,
         }
 
-    def start_chat(self, employee_id: str) -> Dict[str, Any]:
+    async def _run_db(self, fn, *args):
+        """Run synchronous ORM work without blocking the event loop"""
+        if self.async_db is not None:
+            return await self.async_db.run_sync(lambda _: fn(*args))
+        # Off the event loop so a full connection pool cannot stall it
+        return await run_in_threadpool(fn, *args)
+
+    async def _close(self):
+        """Return the session's connection to its pool"""
+        if self.async_db is not None:
+            await self.async_db.close()
+        else:
+            self.db.close()
+
+    async def _rollback(self):
+        """Roll back the session, awaiting it on async sessions"""
+        if self.async_db is not None:
+            await self.async_db.rollback()
+        else:
+            self.db.rollback()
+
+    async def _call_chatbot(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a chatbot endpoint without holding a database connection during the round trip"""
+        # Hand the connection back to the pool, the next query checks one out again
+        await self._close()
+        return await get_chatbot_client().post_json(self.endpoints[endpoint], payload, self.headers)
+
+    async def start_chat(self, employee_id: str) -> Dict[str, Any]:
         """Start a new chat session for an employee"""
         logger.info(f"Starting chat for employee {employee_id}")
 
         try:
             # Call the chatbot API to start a session
-            response = requests.post(
-                self.endpoints["start_chat"],
-                headers=self.headers,
-                json={"employee_id": employee_id},
-            )
-            response.raise_for_status()
-            result = response.json()
+            result = await self._call_chatbot("start_chat", {"employee_id": employee_id})
+            return await self._run_db(self._save_chat_start, employee_id, result)
 
-            # Create database record for this message
-            chat_message = ChatMessage(  # Changed from ChatMessageModel
-                session_id=result["session_id"],
-                employee_id=employee_id,
-                is_from_user=False,
-                question=result["question"],
-                timestamp=datetime.now(timezone.utc),
+        except httpx.HTTPError as e:
+            logger.error(f"API request failed: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"ChatAPI error: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error starting chat: {str(e)}")
+            await self._rollback()
+            raise HTTPException(
+                status_code=500, detail=f"Error starting chat: {str(e)}"
             )
 
-            self.db.add(chat_message)
+    def _save_chat_start(self, employee_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record the opening question of a new session"""
+        # Create database record for this message
+        chat_message = ChatMessage(  # Changed from ChatMessageModel
+            session_id=result["session_id"],
+            employee_id=employee_id,
+            is_from_user=False,
+            question=result["question"],
+            timestamp=datetime.now(timezone.utc),
+        )
+        timestamp = chat_message.timestamp
 
-            # Also update user's last_chat_date
-            user = self.db.query(User).filter(User.employee_id == employee_id).first()
-            if user:
-                user.last_chat_date = datetime.now(timezone.utc)
+        self.db.add(chat_message)
 
-            self.db.commit()
+        # Also update user's last_chat_date
+        user = self.db.query(User).filter(User.employee_id == employee_id).first()
+        if user:
+            user.last_chat_date = datetime.now(timezone.utc)
 
-            return {
-                "session_id": result["session_id"],
-                "question": result["question"],
-                "timestamp": chat_message.timestamp,
-            }
+        self.db.commit()
 
-        except requests.exceptions.RequestException as e:
+        return {
+            "session_id": result["session_id"],
+            "question": result["question"],
+            "timestamp": timestamp,
+        }
+
+    async def process_message(self, session_id: str, message: str,
+                              background_tasks: Optional[BackgroundTasks] = None) -> Dict[str, Any]:
+        """
+        Process a chat message and get the next question or final analysis.
+
+        The store and risk refresh after a final analysis runs after the
+        response when background tasks are given, otherwise in the threadpool.
+        """
+        logger.info(f"Processing message for session {session_id}")
+
+        # First, get the employee ID and most recent question from the session
+        last_question = await self._run_db(self._last_question, session_id)
+
+        if not last_question:
+            raise HTTPException(
+                status_code=404, detail="Chat session or question not found"
+            )
+
+        employee_id = last_question.employee_id
+        question_id = last_question.id
+
+        try:
+            # Call the chatbot API
+            result = await self._call_chatbot("chat", {"session_id": session_id, "message": message})
+            reply = await self._run_db(self._save_reply, session_id, employee_id, question_id, message, result)
+            if self._mood_saved_for is not None:
+                if background_tasks is not None:
+                    background_tasks.add_task(refresh_mood_views, self._mood_saved_for)
+                else:
+                    await run_in_threadpool(refresh_mood_views, self._mood_saved_for)
+            return reply
+
+        except httpx.HTTPError as e:
             logger.error(f"API request failed: {str(e)}")
+            await self._rollback()
             raise HTTPException(status_code=500, detail=f"ChatAPI error: {str(e)}")
         except Exception as e:
-            logger.error(f"Error starting chat: {str(e)}")
-            self.db.rollback()
+            logger.error(f"Error processing message: {str(e)}")
+            logger.error(f"Stack trace: {traceback.format_exc()}")
+            await self._rollback()
             raise HTTPException(
-                status_code=500, detail=f"Error starting chat: {str(e)}"
+                status_code=500, detail=f"Error processing message: {str(e)}"
             )
 
-    def process_message(self, session_id: str, message: str) -> Dict[str, Any]:
-        """Process a chat message and get the next question or final analysis"""
-        logger.info(f"Processing message for session {session_id}")
-
-        # First, get the employee ID and most recent question from the session
-        last_question = (
+    def _last_question(self, session_id: str) -> Optional[ChatMessage]:
+        """Most recent bot question of a session"""
+        return (
             self.db.query(ChatMessage)
             .filter(
                 ChatMessage.session_id == session_id,
@@ -105,100 +197,75 @@ class ChatService:
             .first()
         )
 
-        if not last_question:
-            raise HTTPException(
-                status_code=404, detail="Chat session or question not found"
+    def _save_reply(self, session_id: str, employee_id: str, question_id: int, message: str,
+                    result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record the user's answer together with the chatbot's next question or final analysis"""
+        # Update the last question with the user's response
+        last_question = self.db.get(ChatMessage, question_id)
+        last_question.response = message
+
+        # Process API response
+        if "question" in result and result["question"]:
+            # Create a new record for the bot's next question
+            bot_message = ChatMessage(
+                session_id=session_id,
+                employee_id=employee_id,
+                is_from_user=False,
+                question=result["question"],
+                timestamp=datetime.now(timezone.utc),
             )
+            timestamp = bot_message.timestamp
 
-        employee_id = last_question.employee_id
-
-        try:
-            # Update the last question with the user's response
-            last_question.response = message
-            self.db.flush()
-
-            # Call the chatbot API
-            response = requests.post(
-                self.endpoints["chat"],
-                headers=self.headers,
-                json={"session_id": session_id, "message": message},
-            )
-            response.raise_for_status()
-            result = response.json()
-
-            # Process API response
-            if "question" in result and result["question"]:
-                # Create a new record for the bot's next question
-                bot_message = ChatMessage(
-                    session_id=session_id,
-                    employee_id=employee_id,
-                    is_from_user=False,
-                    question=result["question"],
-                    timestamp=datetime.now(timezone.utc),
-                )
+            self.db.add(bot_message)
+            self.db.commit()
 
-                self.db.add(bot_message)
-                self.db.commit()
+            return {
+                "session_id": session_id,
+                "question": result["question"],
+                "timestamp": timestamp,
+            }
 
-                return {
-                    "session_id": session_id,
-                    "question": result["question"],
-                    "timestamp": bot_message.timestamp,
-                }
+        elif "final_analysis" in result and result["final_analysis"]:
+            # We have a final analysis - process it and update user record
+            self._process_final_analysis(employee_id, result["final_analysis"])
 
-            elif "final_analysis" in result and result["final_analysis"]:
-                # We have a final analysis - process it and update user record
-                self._process_final_analysis(employee_id, result["final_analysis"])
+            last_question.is_from_user = True  # Mark the last question as from user
+            # Commit the last question update
+            self.db.commit()
 
-                last_question.is_from_user = True  # Mark the last question as from user
-                # Commit the last question update
-                self.db.commit()
+            personalized_messages = [
+                "Thank you for sharing your thoughts! Your feedback is incredibly valuable and helps us improve.",
+                "We truly appreciate your candid feedback! Your insights will help shape a better workplace.",
+                "Thank you for your thoughtful response! Your perspective matters greatly to us.",
+                "We've received your feedback—thank you for taking the time to share your thoughts with us!",
+                "Your input is invaluable! Thank you for helping us understand what matters to you.",
+            ]
 
-                personalized_messages = [
-                    "Thank you for sharing your thoughts! Your feedback is incredibly valuable and helps us improve.",
-                    "We truly appreciate your candid feedback! Your insights will help shape a better workplace.",
-                    "Thank you for your thoughtful response! Your perspective matters greatly to us.",
-                    "We've received your feedback—thank you for taking the time to share your thoughts with us!",
-                    "Your input is invaluable! Thank you for helping us understand what matters to you.",
-                ]
-
-                return {
-                    "session_id": session_id,
-                    "question": random.choice(personalized_messages),
-                    "final_analysis": result["final_analysis"],
-                    "timestamp": datetime.now(timezone.utc),
-                }
+            return {
+                "session_id": session_id,
+                "question": random.choice(personalized_messages),
+                "final_analysis": result["final_analysis"],
+                "timestamp": datetime.now(timezone.utc),
+            }
 
-            else:
-                # Unexpected response format, but still commit the user message
-                logger.warning(f"Unexpected API response format: {result}")
-                self.db.commit()
+        else:
+            # Unexpected response format, but still commit the user message
+            logger.warning(f"Unexpected API response format: {result}")
+            self.db.commit()
 
-                personalized_messages = [
-                    "Thank you for sharing your thoughts! Your feedback is incredibly valuable and helps us improve.",
-                    "We truly appreciate your candid feedback! Your insights will help shape a better workplace.",
-                    "Thank you for your thoughtful response! Your perspective matters greatly to us.",
-                    "We've received your feedback—thank you for taking the time to share your thoughts with us!",
-                    "Your input is invaluable! Thank you for helping us understand what matters to you.",
-                ]
-
-                return {
-                    "session_id": session_id,
-                    "question": random.choice(personalized_messages),
-                    "timestamp": datetime.now(timezone.utc),
-                }
+            personalized_messages = [
+                "Thank you for sharing your thoughts! Your feedback is incredibly valuable and helps us improve.",
+                "We truly appreciate your candid feedback! Your insights will help shape a better workplace.",
+                "Thank you for your thoughtful response! Your perspective matters greatly to us.",
+                "We've received your feedback—thank you for taking the time to share your thoughts with us!",
+                "Your input is invaluable! Thank you for helping us understand what matters to you.",
+            ]
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {str(e)}")
-            self.db.rollback()
-            raise HTTPException(status_code=500, detail=f"ChatAPI error: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
-            logger.error(f"Stack trace: {traceback.format_exc()}")
-            self.db.rollback()
-            raise HTTPException(
-                status_code=500, detail=f"Error processing message: {str(e)}"
-            )
+            return {
+                "session_id": session_id,
+                "question": random.choice(personalized_messages),
+                "timestamp": datetime.now(timezone.utc),
+            }
 
     def _process_final_analysis(
         self, employee_id: str, analysis: Dict[str, Any]
@@ -248,17 +315,30 @@ class ChatService:
                     mood_explanation = analysis.get("escalation_reason")
 
                 # Create entry in VibeMeter table with appropriate mood score
-                from app.models.vibemeter import VibeMeter
-
-                vibe_entry = VibeMeter(
-                    employee_id=employee_id,
-                    date=datetime.now(timezone.utc).date(),
-                    mood_score=self._convert_mood_to_score(current_mood),
-                    comments=current_mood,
-                )
+                vibe_entry = {
+                    "employee_id": employee_id,
+                    "date": datetime.now(timezone.utc).date(),
+                    "mood_score": self._convert_mood_to_score(current_mood),
+                    "comments": current_mood,
+                }
 
-                self.db.add(vibe_entry)
+                if settings.INGEST_UPSERT_MODE != "append":
+                    # vibe_meter is unique per employee and day, replace today's response
+                    require_natural_key_index(self.db, VibeMeter)
+                    result = upsert_records(
+                        self.db, VibeMeter, [vibe_entry], VibeMeter.NATURAL_KEY, "update"
+                    )
+                    adjust_row_count(self.db, VibeMeter.__tablename__, result.inserted)
+                    # A replaced response counts with today's score instead of the earlier one
+                    apply_summary_rows(self.db, VibeMeter.__tablename__, result.written, removed=result.replaced)
+                else:
+                    self.db.add(VibeMeter(**vibe_entry))
+                    adjust_row_count(self.db, VibeMeter.__tablename__, 1)
+                    apply_summary_rows(self.db, VibeMeter.__tablename__, [vibe_entry])
+                bump_data_version(self.db, User.__tablename__, VibeMeter.__tablename__)
                 self.db.commit()
+                # The store and risk refresh are CPU work, on an async session this runs on the event loop
+                self._mood_saved_for = employee_id
 
                 logger.info(
                     f"Updated user record and added vibe meter entry for {employee_id}"
@@ -287,10 +367,13 @@ class ChatService:
         # Default to neutral if mood is unknown
         return mood_scores.get(mood, 3)
 
-    def get_chat_history(
+    async def get_chat_history(
         self, employee_id: str, chat_date: Optional[date] = None
     ) -> List[Dict[str, Any]]:
         """Get chat history for an employee without grouping by session"""
+        return await self._run_db(self._chat_history, employee_id, chat_date)
+
+    def _chat_history(self, employee_id: str, chat_date: Optional[date]) -> List[Dict[str, Any]]:
         logger.info(f"Getting chat history for employee {employee_id}")
 
         try:
@@ -368,6 +451,7 @@ class ChatService:
             # Clear escalation flags
             user.hr_escalation = 0
             user.escalation_reason = None
+            bump_data_version(self.db, User.__tablename__)
 
             self.db.commit()
 
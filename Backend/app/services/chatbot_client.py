@@ -0,0 +1,68 @@
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChatbotClient:
+    """
+    Shared async HTTP client for the chatbot service.
+
+    Connections are kept alive and reused across chat turns. At most
+    max_connections requests are in flight at once, further calls wait up
+    to pool_timeout seconds for a free connection and then fail with
+    httpx.PoolTimeout instead of piling up on the chatbot service.
+    """
+
+    def __init__(self, timeout: float, connect_timeout: float, pool_timeout: float,
+                 max_connections: int, max_keepalive: int, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+            limits=httpx.Limits(
+                max_connections=max(1, max_connections),
+                max_keepalive_connections=max(0, min(max_keepalive, max_connections))
+            ),
+            transport=transport,
+        )
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Dict[str, str],
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST a JSON payload and return the decoded response, raising httpx.HTTPError on failure"""
+        extra = {} if timeout is None else {"timeout": timeout}
+        response = await self._client.post(url, json=payload, headers=headers, **extra)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        """Close all pooled connections"""
+        await self._client.aclose()
+
+
+_client: Optional[ChatbotClient] = None
+
+
+def get_chatbot_client() -> ChatbotClient:
+    """Return the process-wide chatbot client, creating it on first use"""
+    global _client
+    # Only touched from the event loop thread, so no lock is needed
+    if _client is None:
+        _client = ChatbotClient(
+            timeout=settings.CHATBOT_TIMEOUT,
+            connect_timeout=settings.CHATBOT_CONNECT_TIMEOUT,
+            pool_timeout=settings.CHATBOT_POOL_TIMEOUT,
+            max_connections=settings.CHATBOT_MAX_CONNECTIONS,
+            max_keepalive=settings.CHATBOT_MAX_KEEPALIVE
+        )
+    return _client
+
+
+async def close_chatbot_client():
+    """Close the chatbot client if it was started"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,167 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer
+
+logger = logging.getLogger(__name__)
+
+# Date formats tried in order when inferring the format of a column
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m-%d-%Y')
+
+# Number of non-null values used to infer a date format
+DATE_SAMPLE_SIZE = 50
+
+# Review periods such as "Annual 2023", "H2 2023" or "Q1 2024" map to the last month of the period
+PERIOD_PATTERN = r'^\s*(Annual|FY|H[12]|Q[1-4])\s+(\d{4})\s*$'
+PERIOD_END_MONTHS = {"annual": 12, "fy": 12, "h1": 6, "h2": 12, "q1": 3, "q2": 6, "q3": 9, "q4": 12}
+
+TRUE_VALUES = {"true", "t", "yes", "y", "1"}
+FALSE_VALUES = {"false", "f", "no", "n", "0"}
+
+# Compiled plans shared by every upload, keyed by table name
+_plan_cache: Dict[str, "ConverterPlan"] = {}
+_plan_cache_lock = threading.Lock()
+
+
+def detect_date_format(series: pd.Series) -> Optional[str]:
+    """Return the first format in DATE_FORMATS that parses every sampled value"""
+    sample = series.dropna().astype(str).head(DATE_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    for fmt in DATE_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    return None
+
+
+def date_format_fits(series: pd.Series, fmt: str) -> bool:
+    """Check whether a known date format parses every sampled value"""
+    sample = series.dropna().astype(str).head(DATE_SAMPLE_SIZE)
+    return bool(pd.to_datetime(sample, format=fmt, errors='coerce').notna().all())
+
+
+def parse_periods(series: pd.Series) -> pd.Series:
+    """Convert review period labels to the date the period ends, NaT where the value is not a period"""
+    parts = series.astype(str).str.extract(PERIOD_PATTERN, flags=re.IGNORECASE).dropna()
+    result = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    if not parts.empty:
+        months = parts[0].str.lower().map(PERIOD_END_MONTHS)
+        period_start = pd.to_datetime(pd.DataFrame({"year": parts[1].astype(int), "month": months, "day": 1}))
+        result.loc[parts.index] = period_start + pd.offsets.MonthEnd(0)
+    return result
+
+
+class ColumnConverter:
+    """Converts one CSV column into the type of the model field it maps to"""
+
+    def __init__(self, csv_column: str, field: str, kind: str):
+        self.csv_column = csv_column
+        self.field = field
+        self.kind = kind
+        # Date format detected on a previous upload, re-checked against each new sample
+        self.date_format = None
+
+    def convert(self, series: pd.Series) -> pd.Series:
+        if self.kind == "integer":
+            return pd.to_numeric(series, errors='coerce').astype("Int64")
+        if self.kind == "float":
+            return pd.to_numeric(series, errors='coerce').astype("float64")
+        if self.kind == "boolean":
+            return self._to_boolean(series)
+        if self.kind in ("date", "datetime", "period"):
+            return self._to_dates(series)
+        return self._to_text(series)
+
+    def _to_boolean(self, series: pd.Series) -> pd.Series:
+        if pd.api.types.is_bool_dtype(series):
+            return series.astype("boolean")
+        lowered = series.astype("string").str.strip().str.lower()
+        result = pd.Series(pd.NA, index=series.index, dtype="boolean")
+        result[lowered.isin(TRUE_VALUES)] = True
+        result[lowered.isin(FALSE_VALUES)] = False
+        return result
+
+    def _to_text(self, series: pd.Series) -> pd.Series:
+        # Keep boolean flags as "True"/"False" text rather than driver specific 1/0
+        if pd.api.types.is_bool_dtype(series):
+            return series.map({True: "True", False: "False"}).astype(object)
+        return series
+
+    def _to_dates(self, series: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            parsed = series
+        else:
+            parsed = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+            remaining = series
+            if self.kind == "period":
+                parsed = parse_periods(series)
+                remaining = series[parsed.isna()]
+            if remaining.notna().any():
+                parsed.loc[remaining.index] = self._parse_with_format(remaining)
+
+        if self.kind == "datetime":
+            return parsed
+        return parsed.dt.date.where(parsed.notna(), None)
+
+    def _parse_with_format(self, series: pd.Series) -> pd.Series:
+        # Reuse the cached format while it still fits the data, otherwise infer it again
+        if self.date_format is None or not date_format_fits(series, self.date_format):
+            self.date_format = detect_date_format(series)
+
+        if self.date_format is None:
+            logger.warning(f"Could not infer a date format for {self.csv_column}, parsing values individually")
+            return pd.to_datetime(series, errors='coerce', format='mixed')
+        return pd.to_datetime(series, errors='coerce', format=self.date_format)
+
+
+class ConverterPlan:
+    """Per-table list of column converters compiled from the CSV column mappings"""
+
+    def __init__(self, table_name: str, model, column_map: Dict[str, str]):
+        self.table_name = table_name
+        columns = model.__table__.columns
+        self.converters: List[ColumnConverter] = []
+
+        for csv_column, field in column_map.items():
+            if field not in columns:
+                continue
+            self.converters.append(ColumnConverter(csv_column, field, self._kind_for(csv_column, columns[field].type)))
+
+        self.csv_columns = [converter.csv_column for converter in self.converters]
+
+    @staticmethod
+    def _kind_for(csv_column: str, column_type) -> str:
+        if isinstance(column_type, DateTime):
+            return "datetime"
+        if isinstance(column_type, Date):
+            return "period" if "period" in csv_column.lower() else "date"
+        if isinstance(column_type, Boolean):
+            return "boolean"
+        if isinstance(column_type, Integer):
+            return "integer"
+        if isinstance(column_type, Float):
+            return "float"
+        return "text"
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert the mapped columns of a CSV chunk into a frame of model fields"""
+        converted = {}
+        for converter in self.converters:
+            if converter.csv_column in df.columns:
+                converted[converter.field] = converter.convert(df[converter.csv_column])
+        return pd.DataFrame(converted, index=df.index)
+
+
+def get_converter_plan(table_name: str, model, column_map: Dict[str, str]) -> ConverterPlan:
+    """Return the cached converter plan for a table, compiling it on first use"""
+    plan = _plan_cache.get(table_name)
+    if plan is None:
+        with _plan_cache_lock:
+            plan = _plan_cache.get(table_name)
+            if plan is None:
+                plan = ConverterPlan(table_name, model, column_map)
+                _plan_cache[table_name] = plan
+    return plan
@@ -1,16 +1,18 @@
 import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect, text, func, create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect, text, func, create_engine, literal, select, union, and_, or_, Date, DateTime, String
 import logging
-from datetime import datetime
+from datetime import date, datetime
 from typing import Dict, Any, List
+import csv
+import io
 import re
 import os
-import threading
+import time
 import uuid
-import multiprocessing
 from functools import partial
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import deque
 from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -25,14 +27,58 @@ from app.models.performance import PerformanceTracker
 from app.models.rewards import RewardsTracker
 from app.models.employee import Employee
 from app.models.onboarding import OnboardingTracker
-from app.core.auth import get_password_hash
+from app.models.ingested_file import IngestedFile, IngestStatus
+from app.core.auth import DEFERRED_PASSWORD
 from app.models.user import User, UserRole  # Add User model import
-
-# Add this global dictionary to track background jobs
-background_jobs = {}
+from app.services.bulk_insert import bulk_insert_frame, dialect_insert, upsert_frame
+from app.services.column_converters import ConverterPlan, get_converter_plan
+from app.services.ingest_executor import IngestQueueFull, get_ingest_executor
+from app.services.row_counts import adjust_row_count, get_row_count
+from app.services.report_summary import apply_summary_rows, ensure_summary_built
+from app.services.data_versions import bump_data_version
+from app.services.analytics_store import refresh_store_table
+from app.services.risk_scores import refresh_risk_scores
+from app.services.row_serializer import dumps_lines, get_serializer
+from app.services.pagination import InvalidCursor, InvalidQuery, decode_cursor, encode_cursor
+from app.services.job_registry import (
+    FINAL_STATUSES, create_job, delete_job, get_job, list_jobs, register_job_runner, update_job
+)
+from app.models.background_job import BackgroundJob, JobStatus
 
 logger = logging.getLogger(__name__)
 
+# How often a job checks an identical upload that another job is still ingesting
+CLAIM_POLL_SECONDS = 2
+
+def read_csv_blocks(csv_file, block_bytes: int):
+    """
+    Yield blocks of roughly block_bytes from a binary CSV file, always ending on
+    a row boundary. A block that ends inside a quoted field is extended until
+    its quotes balance, so multi-line values are never split.
+    """
+    while True:
+        block = csv_file.read(block_bytes)
+        if not block:
+            return
+        block += csv_file.readline()
+        while block.count(b'"') % 2:
+            line = csv_file.readline()
+            if not line:
+                break
+            block += line
+        if block.strip():
+            yield block
+
+def parse_csv_block(table_name: str, headers: List[str], usecols: List[str], block: bytes) -> pd.DataFrame:
+    """Parse one block of CSV rows into converted model fields, runs in an ingest worker process"""
+    df = pd.read_csv(io.BytesIO(block), header=None, names=headers, usecols=usecols)
+    return CSVProcessor(None)._prepare_frame(df, table_name)
+
+def _csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
 class CSVProcessor:
     def __init__(self, db: Session):
         self.db = db
@@ -103,6 +149,25 @@ class CSVProcessor:
             "vibe_meter": VibeMeter,
             "users": User,
         }
+        
+        # Columns behind the date range and score filters of the data endpoints
+        self.date_columns = {
+            "activity_tracker": "date",
+            "leave_tracker": "start_date",
+            "onboarding_tracker": "joining_date",
+            "performance_tracker": "review_date",
+            "rewards_tracker": "date",
+            "vibe_meter": "date",
+        }
+        self.score_columns = {
+            "activity_tracker": "work_hours",
+            "performance_tracker": "rating",
+            "rewards_tracker": "amount",
+            "vibe_meter": "mood_score",
+        }
+        
+        # Timing of the most recent bulk insert
+        self.last_insert_stats = {}
     
     def ensure_tables_exist(self):
         """Ensure all database tables exist before attempting inserts"""
@@ -128,17 +193,15 @@ class CSVProcessor:
         
         # Process and insert the data
         try:
-            # First handle date columns and convert to proper format
-            for col in df.columns:
-                if 'date' in col.lower() or 'period' in col.lower():
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    
+            # Column conversion happens in _insert_data through the table's converter plan
             records_added = self._insert_data(df, table_name)
             return {
                 "success": True,
                 "table": table_name,
                 "message": f"Successfully added data to {table_name}",
-                "records_added": records_added
+                "records_added": records_added,
+                "duplicates_dropped": self.last_insert_stats.get("duplicates_dropped", 0),
+                "rows_per_sec": self.last_insert_stats.get("rows_per_sec")
             }
         except Exception as e:
             logger.error(f"Error inserting data into {table_name}: {str(e)}")
@@ -175,11 +238,26 @@ class CSVProcessor:
             "status": "processing"
         }
 
-    def process_csv_async(self, file_content, filename):
-        """Process CSV file asynchronously and track with job ID"""
-        job_id = str(uuid.uuid4())
+    def process_csv_async(self, file_path, filename, content_hash=None, batch_id=None):
+        """
+        Process a spooled CSV file asynchronously and track with job ID.
+        
+        The file is parsed in fixed-size chunks and each chunk is inserted and
+        committed as it arrives, so memory use does not grow with the file size.
+        The spooled file is removed once processing finishes. When a content
+        hash is given, a file that was already ingested is skipped.
+        """
+        bytes_total = os.path.getsize(file_path)
+        job_id = create_job(
+            "csv_ingest",
+            JobStatus.QUEUED,
+            filename=filename,
+            batch_id=batch_id,
+            bytes_total=bytes_total
+        )
         
         def background_task():
+            db = None
             try:
                 # Create a new session for this thread
                 from app.core.database import SessionLocal
@@ -188,369 +266,290 @@ class CSVProcessor:
                 # Create a processor with the new session
                 processor = CSVProcessor(db)
                 
-                # Read the CSV content
-                import io
-                df = pd.read_csv(io.StringIO(file_content.decode('utf-8')))
+                # Skip files whose exact content was already ingested
+                if content_hash and not processor._claim_file_hash(content_hash, filename, job_id):
+                    previous = db.query(IngestedFile).filter(IngestedFile.content_hash == content_hash).first()
+                    update_job(
+                        job_id,
+                        JobStatus.COMPLETED,
+                        f"Identical file already ingested as {previous.filename if previous else 'an earlier upload'}",
+                        table_name=previous.table_name if previous else None,
+                        result={"records_added": 0, "skipped": True}
+                    )
+                    return
                 
-                # Process date columns
-                for col in df.columns:
-                    if 'date' in col.lower() or 'period' in col.lower():
-                        try:
-                            df[col] = pd.to_datetime(df[col], errors='coerce')
-                        except Exception as e:
-                            logger.error(f"Error converting dates in {col}: {str(e)}")
+                records_added = 0
+                duplicates_dropped = 0
                 
-                # Identify table and insert data
-                table_name = processor._identify_table(list(df.columns))
+                # Identify the table from the header line alone
+                headers = list(pd.read_csv(file_path, nrows=0).columns)
+                table_name = processor._identify_table(headers)
                 if not table_name:
-                    background_jobs[job_id] = {
-                        "status": "failed",
-                        "message": f"Could not identify table for file: {filename}",
-                        "completed_at": datetime.now().isoformat()
-                    }
+                    processor._release_file_hash(content_hash, job_id)
+                    update_job(job_id, JobStatus.FAILED, f"Could not identify table for file: {filename}")
                     return
+                update_job(job_id, JobStatus.RUNNING, f"Loading {filename} into {table_name}", table_name=table_name)
+                
+                # Only parse the columns the converter plan maps to model fields
+                plan = processor._get_converter_plan(table_name)
+                usecols = [col for col in headers if col in plan.csv_columns]
+                
+                executor = get_ingest_executor()
+                pending_blocks = deque()
+                touched_ids = set()
+                
+                def commit_next_block(rows_so_far):
+                    # Insert and commit the oldest parsed block, in file order
+                    nonlocal duplicates_dropped
+                    future, bytes_read = pending_blocks.popleft()
+                    frame = future.result()
+                    rows = processor._insert_frame(frame, table_name)
+                    duplicates_dropped += processor.last_insert_stats["duplicates_dropped"]
+                    touched_ids.update(processor._frame_employee_ids(frame) or ())
+                    update_job(job_id, rows_processed=rows_so_far + rows, bytes_read=bytes_read)
+                    return rows
                 
-                # Insert the data
-                records_added = processor._insert_data(df, table_name)
+                with open(file_path, 'rb') as csv_file:
+                    csv_file.readline()  # Skip the header line
+                    for block in read_csv_blocks(csv_file, settings.INGEST_PARSE_BLOCK_BYTES):
+                        # Parse blocks on the process pool while earlier ones are written
+                        future = executor.submit_parse(parse_csv_block, table_name, headers, usecols, block)
+                        pending_blocks.append((future, csv_file.tell()))
+                        if len(pending_blocks) > max(1, executor.parse_workers):
+                            records_added += commit_next_block(records_added)
+                    while pending_blocks:
+                        records_added += commit_next_block(records_added)
+                
+                # The collective report reads the aggregates without ever building them
+                ensure_summary_built(db)
+                # Scored once per file rather than after every block
+                refresh_risk_scores(db, table_name, touched_ids)
+                
+                processor._record_file_hash(content_hash, job_id, table_name, records_added)
                 
                 # Update job status
-                background_jobs[job_id] = {
-                    "status": "completed",
-                    "table": table_name,
-                    "records_added": records_added,
-                    "filename": filename,
-                    "completed_at": datetime.now().isoformat()
-                }
+                message = f"Successfully added {records_added} records to {table_name}"
+                if duplicates_dropped:
+                    message += f", skipped {duplicates_dropped} rows repeating a natural key within the file"
+                update_job(
+                    job_id,
+                    JobStatus.COMPLETED,
+                    message,
+                    rows_processed=records_added,
+                    bytes_read=bytes_total,
+                    result={"records_added": records_added, "duplicates_dropped": duplicates_dropped}
+                )
                 
                 logger.info(f"Background job completed: {filename}, added {records_added} records to {table_name}")
                 
-                # Close the session
-                db.close()
-                
             except Exception as e:
                 logger.error(f"Background job failed for {filename}: {str(e)}")
-                background_jobs[job_id] = {
-                    "status": "failed",
-                    "message": str(e),
-                    "filename": filename,
-                    "completed_at": datetime.now().isoformat()
-                }
-        
-        # Initialize job status
-        background_jobs[job_id] = {
-            "status": "processing",
-            "filename": filename,
-            "started_at": datetime.now().isoformat()
-        }
+                if db is not None:
+                    db.rollback()
+                    # Let a retry of the same file go through
+                    CSVProcessor(db)._release_file_hash(content_hash, job_id)
+                update_job(job_id, JobStatus.FAILED, str(e))
+            finally:
+                # Close the session and drop the spooled upload
+                if db is not None:
+                    db.close()
+                if os.path.exists(file_path):
+                    os.remove(file_path)
         
-        # Start background thread
-        thread = threading.Thread(target=background_task)
-        thread.daemon = True
-        thread.start()
+        # Queue on the shared ingest executor, raises IngestQueueFull when it has no room
+        try:
+            get_ingest_executor().submit(background_task)
+        except IngestQueueFull:
+            delete_job(job_id)
+            os.remove(file_path)
+            raise
         
-        return {"job_id": job_id, "status": "processing", "filename": filename}
+        return {"job_id": job_id, "status": JobStatus.QUEUED.value, "filename": filename}
     
-    def create_users_from_employee_ids(self):
-        """Create user accounts for all employee IDs in the database"""
-        logger.info("Creating user accounts for all employee IDs...")
-        
-        # Get unique employee IDs from all tables
-        unique_employee_ids = set()
-        
-        for table_name, model in self.table_models.items():
-            if hasattr(model, 'employee_id'):
-                # Get all unique employee IDs from this table
-                employee_ids = self.db.query(model.employee_id).distinct().all()
-                for record in employee_ids:
-                    if record[0]:  # Skip None values
-                        unique_employee_ids.add(record[0])
-        
-        logger.info(f"Found {len(unique_employee_ids)} unique employee IDs")
-        
-        if not unique_employee_ids:
-            logger.warning("No employee IDs found in any tables.")
-            return {"employees_created": 0, "users_created": 0, "message": "No employee IDs found"}
-        
-        # Check for existing employees and users to avoid creating duplicates
-        from app.models.user import User
-        from app.models.employee import Employee
+    def _claim_file_hash(self, content_hash: str, filename: str, job_id: str) -> bool:
+        """
+        Claim a file hash for a job before ingesting it, returns False if the content was already ingested.
         
-        existing_employees = {e.employee_id for e in self.db.query(Employee.employee_id).all() if e.employee_id}
-        existing_users = {u.employee_id for u in self.db.query(User.employee_id).all() if u.employee_id}
+        A failed claim, or one whose job has finished or disappeared without
+        completing the file, is taken over. While another running job holds
+        the claim this waits for its outcome, so a failure there does not
+        lose the identical file.
+        """
+        waiting = False
+        while True:
+            try:
+                self.db.add(IngestedFile(content_hash=content_hash, filename=filename, job_id=job_id))
+                self.db.commit()
+                return True
+            except IntegrityError:
+                self.db.rollback()
+            
+            claim = self.db.query(IngestedFile).filter(IngestedFile.content_hash == content_hash).first()
+            if claim is None:
+                # Removed in the meantime, try to insert again
+                continue
+            if claim.status == IngestStatus.DONE:
+                return False
+            if claim.status == IngestStatus.FAILED or self._claim_is_orphaned(claim):
+                # Conditional on the state just read, so only one job takes over a claim
+                taken = self.db.query(IngestedFile).filter(
+                    IngestedFile.content_hash == content_hash,
+                    IngestedFile.status == claim.status,
+                    IngestedFile.job_id == claim.job_id
+                ).update({
+                    "status": IngestStatus.IN_PROGRESS, "job_id": job_id, "filename": filename,
+                    "ingested_at": datetime.utcnow()
+                }, synchronize_session=False)
+                self.db.commit()
+                if taken:
+                    logger.info(f"Job {job_id} took over the claim on {filename} from job {claim.job_id}")
+                    return True
+                continue
+            
+            if not waiting:
+                update_job(job_id, message=f"Waiting for the identical upload {claim.filename} to finish")
+                waiting = True
+            # End the transaction so the next read sees the other job's outcome
+            self.db.rollback()
+            time.sleep(CLAIM_POLL_SECONDS)
+    
+    def _claim_is_orphaned(self, claim: IngestedFile) -> bool:
+        """Check whether the job holding an in-progress claim has stopped without finishing the file"""
+        job = self.db.get(BackgroundJob, claim.job_id) if claim.job_id else None
+        return job is None or job.status in FINAL_STATUSES
+    
+    def _record_file_hash(self, content_hash: str, job_id: str, table_name: str, records_added: int):
+        """Store the outcome of an ingested file in the hash registry and mark it done"""
+        if not content_hash:
+            return
+        self.db.query(IngestedFile).filter(
+            IngestedFile.content_hash == content_hash,
+            IngestedFile.job_id == job_id
+        ).update({"status": IngestStatus.DONE, "table_name": table_name, "records_added": records_added})
+        self.db.commit()
+    
+    def _release_file_hash(self, content_hash: str, job_id: str):
+        """Mark a job's claim on a file hash failed so the same file can be ingested again"""
+        if not content_hash:
+            return
+        try:
+            self.db.query(IngestedFile).filter(
+                IngestedFile.content_hash == content_hash,
+                IngestedFile.job_id == job_id
+            ).update({"status": IngestStatus.FAILED})
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Error releasing file hash {content_hash}: {str(e)}")
+            self.db.rollback()
+    
+    def create_users_from_employee_ids(self):
+        """
+        Create employee records and user accounts for all employee IDs in the database.
         
-        # Filter out employee IDs that already have records
-        employees_to_create = unique_employee_ids - existing_employees
-        users_to_create = unique_employee_ids - existing_users
+        Both inserts run as INSERT ... SELECT over the union of employee IDs in
+        every table with ON CONFLICT DO NOTHING, and the created rows are
+        counted from RETURNING. Accounts get a deferred password, the bcrypt
+        hash is only computed when the employee first logs in.
+        """
+        logger.info("Creating user accounts for all employee IDs...")
         
-        logger.info(f"Found {len(employees_to_create)} employees and {len(users_to_create)} users to create")
+        # Every distinct employee ID referenced by any table
+        sources = [
+            select(model.employee_id).where(model.employee_id.isnot(None))
+            for model in self.table_models.values() if hasattr(model, 'employee_id')
+        ]
+        employee_ids = union(*sources).subquery("employee_ids")
+        emp_id = employee_ids.c.employee_id
+        
+        employees = Employee.__table__
+        # The WHERE keeps SQLite from parsing ON CONFLICT as a join constraint
+        employee_insert = dialect_insert(self.db, employees).from_select(
+            ["employee_id", "name", "department"],
+            select(emp_id, literal("Employee ", String) + emp_id, literal("Unassigned", String)).where(emp_id.isnot(None))
+        ).on_conflict_do_nothing(index_elements=["employee_id"]).returning(employees.c.id)
+        
+        users = User.__table__
+        username = func.lower(emp_id)
+        has_user = select(users.c.id).where(users.c.employee_id == emp_id).exists()
+        # Usernames and emails are unique as well, an ID whose username is taken is skipped
+        user_insert = dialect_insert(self.db, users).from_select(
+            ["email", "username", "hashed_password", "role", "employee_id"],
+            select(
+                username + literal("@example.com", String),
+                username,
+                literal(DEFERRED_PASSWORD, String),
+                literal(UserRole.EMPLOYEE.value, String),
+                emp_id
+            ).where(~has_user)
+        ).on_conflict_do_nothing().returning(users.c.id)
         
-        # Process them with multiprocessing if enough records
-        if len(employees_to_create) > 50 or len(users_to_create) > 50:
-            # Get database URL for worker processes
-            from app.config import settings
-            db_url = settings.DATABASE_URL
-            
-            # Determine optimal batch size and worker count
-            cpu_count = multiprocessing.cpu_count()
-            logger.info(f"Detected {cpu_count} CPU cores")
-            worker_count = min(cpu_count, 18)  # Limit to avoid database connection issues
-            
-            # Create batches of IDs to process
-            all_ids_to_process = list(unique_employee_ids)
-            batch_size = max(50, len(all_ids_to_process) // worker_count)
-            batches = [all_ids_to_process[i:i + batch_size] for i in range(0, len(all_ids_to_process), batch_size)]
-            
-            logger.info(f"Processing {len(unique_employee_ids)} IDs in {len(batches)} batches using {worker_count} workers")
-            
-            # Process batches in parallel
-            total_employees_created = 0
-            total_users_created = 0
-            
-            with ProcessPoolExecutor(max_workers=worker_count) as executor:
-                futures = []
-                for batch in batches:
-                    # Create a tuple of (batch, existing_employees, existing_users, db_url)
-                    futures.append(executor.submit(
-                        self._process_user_creation_batch, 
-                        batch, 
-                        list(existing_employees), 
-                        list(existing_users), 
-                        db_url
-                    ))
-                
-                # Collect results
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        total_employees_created += result['employees_created']
-                        total_users_created += result['users_created']
-                    except Exception as e:
-                        logger.error(f"Error in worker process: {str(e)}")
-            
-            logger.info(f"Created {total_employees_created} employee records and {total_users_created} user accounts using multiprocessing")
-            return {"employees_created": total_employees_created, "users_created": total_users_created}
-            
-        else:
-            # For small batches, process sequentially to avoid multiprocessing overhead
-            from app.core.auth import get_password_hash
-            
-            users_created = 0
-            employees_created = 0
-            
-            for emp_id in unique_employee_ids:
-                # Check if Employee record exists
-                existing_employee = self.db.query(Employee).filter(Employee.employee_id == emp_id).first()
-                if not existing_employee:
-                    employee = Employee(
-                        employee_id=emp_id,
-                        name=f"Employee {emp_id}",
-                        department="Unassigned"
-                    )
-                    self.db.add(employee)
-                    employees_created += 1
-                
-                # Check if User record exists
-                existing_user = self.db.query(User).filter(User.employee_id == emp_id).first()
-                if not existing_user:
-                    user = User(
-                        email=f"{emp_id.lower()}@example.com",
-                        username=emp_id.lower(),
-                        hashed_password=get_password_hash(emp_id.lower()),
-                        role="employee",
-                        employee_id=emp_id
-                    )
-                    self.db.add(user)
-                    users_created += 1
-            
-            # Commit changes
+        try:
+            employees_created = len(self.db.execute(employee_insert).all())
+            users_created = len(self.db.execute(user_insert).all())
+            adjust_row_count(self.db, User.__tablename__, users_created)
+            if employees_created or users_created:
+                bump_data_version(self.db, Employee.__tablename__, User.__tablename__)
             self.db.commit()
-            
-            logger.info(f"Created {employees_created} employee records and {users_created} user accounts")
-            return {"employees_created": employees_created, "users_created": users_created}
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        logger.info(f"Created {employees_created} employee records and {users_created} user accounts")
+        return {"employees_created": employees_created, "users_created": users_created}
     
     def create_users_from_employee_ids_async(self):
         """Create users from all employee IDs in a background job"""
-        job_id = str(uuid.uuid4())
+        job_id = create_job("create_users", JobStatus.QUEUED)
         
-        # Start the background task
-        background_tasks.add_task(
-            self._create_users_from_employee_ids_task, 
-            job_id=job_id
-        )
+        # Run on the shared ingest executor, raises IngestQueueFull when it has no room
+        try:
+            get_ingest_executor().submit(self._run_user_creation_job, job_id)
+        except IngestQueueFull:
+            delete_job(job_id)
+            raise
         
         return {"job_id": job_id}
     
-    async def _create_users_from_employee_ids_task(self, job_id):
-        """Background task to create users from all employee IDs using multiprocessing"""
-        self.logger.info(f"Starting job {job_id}: Creating users from employee IDs")
+    @staticmethod
+    def _start_user_creation_job(job_id):
+        """Start a user creation job whose CSV dependencies have finished"""
+        # The job stays queued until the pool has a free slot, it is never run on the caller's thread
+        get_ingest_executor().submit_deferred(CSVProcessor._run_user_creation_job, job_id)
+    
+    @staticmethod
+    def _run_user_creation_job(job_id):
+        """Create users from all employee IDs and record the outcome on the job"""
+        from app.core.database import SessionLocal
         
+        update_job(job_id, JobStatus.RUNNING, "Creating users from employee IDs")
+        db = SessionLocal()
         try:
-            # Create a job record
-            job = BackgroundJob(
-                id=job_id,
-                job_type="create_users",
-                status=JobStatus.RUNNING,
-                start_time=datetime.now()
-            )
-            self.db.add(job)
-            self.db.commit()
-            
-            # Get all employee IDs from the database
-            employees = self.db.query(Employee).all()
-            total_count = len(employees)
-            
-            if total_count == 0:
-                self.logger.warning("No employee records found in database")
-                self._update_job_status(job_id, JobStatus.COMPLETED, f"No employee records found")
-                return
-            
-            self.logger.info(f"Found {total_count} employee records")
-            
-            # Get all existing users to avoid duplicates
-            existing_users = self.db.query(User.employee_id).all()
-            existing_ids = set([u[0] for u in existing_users])
-            
-            # Filter employees that don't have users yet
-            employees_to_process = [e for e in employees if e.employee_id not in existing_ids]
-            
-            if not employees_to_process:
-                self.logger.info("All employees already have user accounts")
-                self._update_job_status(job_id, JobStatus.COMPLETED, f"All employees already have user accounts")
-                return
-            
-            self.logger.info(f"Creating users for {len(employees_to_process)} employees")
-            
-            # Set up progress tracking
-            total = len(employees_to_process)
-            created_count = 0
-            error_count = 0
-            
-            # Split employees into chunks for parallel processing
-            chunk_size = max(1, total // (multiprocessing.cpu_count() * 2))
-            employee_chunks = [employees_to_process[i:i+chunk_size] for i in range(0, total, chunk_size)]
-            
-            # Create a database URL without the SQLAlchemy connection info for worker processes
-            db_url = settings.DATABASE_URL
-            
-            # Process chunks in parallel
-            with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-                # Create partial function with database URL
-                process_chunk_fn = partial(self._process_employee_chunk, db_url=db_url)
-                
-                # Submit all chunks for processing
-                futures = {executor.submit(process_chunk_fn, chunk): i for i, chunk in enumerate(employee_chunks)}
-                
-                # Process results as they complete
-                for future in as_completed(futures):
-                    chunk_result = future.result()
-                    created_count += chunk_result['created']
-                    error_count += chunk_result['errors']
-                    
-                    # Update progress
-                    progress = int((created_count + error_count) / total * 100)
-                    self._update_job_status(
-                        job_id, 
-                        JobStatus.RUNNING, 
-                        f"Progress: {progress}%. Created: {created_count}, Errors: {error_count}"
-                    )
-            
-            # Job completed
-            self._update_job_status(
-                job_id, 
+            result = CSVProcessor(db).create_users_from_employee_ids()
+            update_job(
+                job_id,
                 JobStatus.COMPLETED,
-                f"Created {created_count} users with {error_count} errors"
+                f"Created {result['employees_created']} employee records and {result['users_created']} user accounts",
+                rows_processed=result["users_created"],
+                result=result
             )
-            
-        except Exception as e:
-            self.logger.error(f"Error in job {job_id}: {str(e)}")
-            self._update_job_status(job_id, JobStatus.FAILED, str(e))
-    
-    @staticmethod
-    def _process_user_creation_batch(employee_ids, existing_employees, existing_users, db_url):
-        """Process a batch of employee IDs to create users and employees in a worker process"""
-        # Import needed modules in the worker process
-        from sqlalchemy import create_engine
-        from sqlalchemy.orm import sessionmaker
-        from app.models.user import User
-        from app.models.employee import Employee
-        from app.core.auth import get_password_hash
-        import logging
-        
-        logger = logging.getLogger(__name__)
-        
-        logger.info(f"Processing batch of {len(employee_ids)} employee IDs")
-        # Convert lists back to sets for faster lookups
-        existing_employees_set = set(existing_employees)
-        existing_users_set = set(existing_users)
-        
-        # Create a new database connection for this process
-        engine = create_engine(db_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        
-        employees_created = 0
-        users_created = 0
-        
-        with SessionLocal() as db:
-            try:
-                for emp_id in employee_ids:
-                    # Check if Employee record exists
-                    if emp_id not in existing_employees_set:
-                        employee = Employee(
-                            employee_id=emp_id,
-                            name=f"Employee {emp_id}",
-                            department="Unassigned"
-                        )
-                        db.add(employee)
-                        employees_created += 1
-                    
-                    # Check if User record exists
-                    if emp_id not in existing_users_set:
-                        user = User(
-                            email=f"{emp_id.lower()}@example.com",
-                            username=emp_id.lower(),
-                            hashed_password=get_password_hash(emp_id.lower()),
-                            role="employee",
-                            employee_id=emp_id
-                        )
-                        db.add(user)
-                        users_created += 1
-                
-                # Commit all changes at once for this batch
-                db.commit()
-                
-            except Exception as e:
-                logger.error(f"Error processing user creation batch: {str(e)}")
-                db.rollback()
-                raise
-                
-        return {
-            "employees_created": employees_created,
-            "users_created": users_created
-        }
-    
-    def _update_job_status(self, job_id, status, message=None):
-        """Update the status and message of a background job"""
-        try:
-            job = self.db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
-            if job:
-                job.status = status
-                if message:
-                    job.message = message
-                if status in [JobStatus.COMPLETED, JobStatus.FAILED]:
-                    job.end_time = datetime.now()
-                self.db.commit()
+            logger.info(f"Created {result['employees_created']} employee records and {result['users_created']} user accounts")
         except Exception as e:
-            self.logger.error(f"Error updating job {job_id} status: {str(e)}")
+            logger.error(f"Error in user creation process: {str(e)}")
+            db.rollback()
+            update_job(job_id, JobStatus.FAILED, str(e))
+        finally:
+            db.close()
     
     def get_job_status(self, job_id):
         """Get the status of a background job"""
-        if job_id in background_jobs:
-            return background_jobs[job_id]
+        job = get_job(self.db, job_id)
+        if job:
+            return job
         return {"status": "not_found", "message": "Job not found"}
     
     def get_all_jobs(self):
-        """Get status of all background jobs"""
-        return background_jobs
+        """Get status of recent background jobs"""
+        return {job["job_id"]: job for job in list_jobs(self.db)}
 
     def _identify_table(self, headers: List[str]) -> str:
         """Identify the table based on headers"""
@@ -569,11 +568,76 @@ class CSVProcessor:
         
         return best_match
     
+    def _prepare_frame(self, df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+        """Map CSV columns to model fields with the table's cached converter plan"""
+        plan = self._get_converter_plan(table_name)
+        frame = plan.apply(df)
+        
+        # Add default values for missing fields
+        if table_name == "leave_tracker" and "status" not in frame.columns:
+            frame["status"] = "Approved"
+        
+        return frame
+    
+    def _get_converter_plan(self, table_name: str) -> ConverterPlan:
+        """Get the compiled column converters for a table"""
+        return get_converter_plan(table_name, self.table_models[table_name], self.column_mappings[table_name])
+    
     def _insert_data(self, df: pd.DataFrame, table_name: str) -> int:
-        """Insert data into the table with proper column mappings"""
+        """Insert data into the table with set-based bulk inserts"""
+        frame = self._prepare_frame(df, table_name)
+        records_added = self._insert_frame(frame, table_name)
+        ensure_summary_built(self.db)
+        refresh_risk_scores(self.db, table_name, self._frame_employee_ids(frame))
+        return records_added
+    
+    @staticmethod
+    def _frame_employee_ids(frame: pd.DataFrame):
+        """Employee IDs in a frame of model fields, None when it has no employee_id column"""
+        return set(frame["employee_id"].dropna().unique()) if "employee_id" in frame else None
+    
+    def _insert_frame(self, frame: pd.DataFrame, table_name: str) -> int:
+        """Bulk insert a frame of already converted model fields and commit"""
+        model_class = self.table_models[table_name]
+        started = time.perf_counter()
+        
+        upsert_mode = settings.INGEST_UPSERT_MODE
+        if upsert_mode != "append" and hasattr(model_class, "NATURAL_KEY"):
+            # Only rows that are new or changed on the natural key are written
+            written, replaced, duplicates_dropped = upsert_frame(self.db, model_class, frame, upsert_mode)
+            records_added = len(written)
+            adjust_row_count(self.db, model_class.__tablename__, len(written) - len(replaced))
+            # Overwritten rows count with their new values instead of their old ones
+            apply_summary_rows(self.db, table_name, written, removed=replaced)
+        else:
+            records_added = bulk_insert_frame(self.db, model_class, frame)
+            duplicates_dropped = 0
+            adjust_row_count(self.db, model_class.__tablename__, records_added)
+            apply_summary_rows(self.db, table_name, frame)
+        
+        if records_added:
+            bump_data_version(self.db, table_name)
+        self.db.commit()
+        refresh_store_table(self.db, table_name)
+        
+        elapsed = time.perf_counter() - started
+        rows_per_sec = records_added / elapsed if elapsed > 0 else 0.0
+        self.last_insert_stats = {
+            "table": table_name,
+            "records_added": records_added,
+            "duplicates_dropped": duplicates_dropped,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows_per_sec, 1)
+        }
+        logger.info(f"Inserted {records_added} rows into {table_name} in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+        return records_added
+    
+    def _insert_data_orm(self, df: pd.DataFrame, table_name: str) -> int:
+        """Row-by-row ORM insert, kept as the baseline for the bulk insert benchmark"""
         model_class = self.table_models[table_name]
         column_map = self.column_mappings[table_name]
         records_added = 0
+        added_rows = []
         
         # Process each row and insert
         for _, row in df.iterrows():
@@ -598,6 +662,7 @@ class CSVProcessor:
                 # Create model instance
                 db_model = model_class(**processed_row)
                 self.db.add(db_model)
+                added_rows.append(processed_row)
                 records_added += 1
                 
                 # Commit in batches to avoid memory issues
@@ -609,7 +674,11 @@ class CSVProcessor:
                 raise
         
         # Commit all changes
+        adjust_row_count(self.db, model_class.__tablename__, records_added)
+        apply_summary_rows(self.db, table_name, added_rows)
+        bump_data_version(self.db, table_name)
         self.db.commit()
+        refresh_risk_scores(self.db, table_name)
         return records_added
     
     def _parse_date(self, date_str: str) -> datetime:
@@ -629,20 +698,23 @@ class CSVProcessor:
             # Return a default date if parsing fails
             return datetime.now()
     
-    def get_table_info(self) -> List[Dict[str, Any]]:
+    def get_table_info(self, exact: bool = False) -> List[Dict[str, Any]]:
         """
         Get information about all tables in the database
+        
+        Counts come from the maintained row counters or planner estimates
+        unless exact is set, see app.services.row_counts.
         """
         tables = []
         
         for table_name, model in self.table_models.items():
             try:
-                # Count records in table
-                count = self.db.query(model).count()
+                count, count_source = get_row_count(self.db, model, exact)
                 tables.append({
                     "name": table_name,
                     "record_count": count,
-                    "columns": self.table_headers[table_name]
+                    "count_source": count_source,
+                    "columns": self.table_headers.get(table_name, [column.name for column in model.__table__.columns])
                 })
             except Exception as e:
                 logger.error(f"Error getting info for table {table_name}: {str(e)}")
@@ -653,37 +725,196 @@ class CSVProcessor:
         
         return tables
     
-    def get_table_data(self, table_name, limit=None, offset=0):
-        """Get data from a table with pagination"""
-        try:
-            # Get the SQLAlchemy model for the table
-            model = self._get_model_from_table_name(table_name)
-            
-            # Build query with ordering
-            query = self.db.query(model).order_by(model.id)
-            
-            # Apply pagination only if limit is specified
-            if limit is not None:
-                query = query.offset(offset).limit(limit)
+    def _table_query(self, model, fields=None, filters=None, sort=None):
+        """
+        Select the rows of a table that the data endpoints expose.
+        
+        fields limits the columns returned (id and the sort column are always
+        included), filters holds employee_id, date_from/date_to on the table's
+        date column and min_score/max_score on its score column. Everything is
+        validated against the model and raises InvalidQuery when it does not fit.
+        """
+        table = model.__table__
+        serializer = get_serializer(model)
+        
+        if fields:
+            unknown = [field for field in fields if field not in serializer.names]
+            if unknown:
+                raise InvalidQuery(f"Unknown fields for {table.name}: {', '.join(unknown)}")
+            extra = [sort.lstrip("-")] if sort else []
+            columns = [table.c[name] for name in dict.fromkeys(["id"] + extra + list(fields))]
+        else:
+            columns = serializer.columns
+        query = select(*columns)
+        
+        if model is User:
+            # HR and admin accounts are not listed alongside employee data
+            query = query.where(User.role == UserRole.EMPLOYEE)
+        
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+        if "employee_id" in filters:
+            if "employee_id" not in table.c:
+                raise InvalidQuery(f"{table.name} has no employee_id column")
+            query = query.where(table.c.employee_id == filters["employee_id"])
+        
+        for bounds, columns_by_table, kind in (
+            (("date_from", "date_to"), self.date_columns, "date"),
+            (("min_score", "max_score"), self.score_columns, "score"),
+        ):
+            lower, upper = (filters.get(bound) for bound in bounds)
+            if lower is None and upper is None:
+                continue
+            if table.name not in columns_by_table:
+                raise InvalidQuery(f"{table.name} has no {kind} column to filter on")
+            column = table.c[columns_by_table[table.name]]
+            if lower is not None:
+                query = query.where(column >= lower)
+            if upper is not None:
+                query = query.where(column <= upper)
+        
+        return query
+    
+    def _sort_column(self, model, sort):
+        """Resolve a sort parameter such as "date" or "-date" to (column, descending)"""
+        if not sort:
+            return None, False
+        name = sort.lstrip("-")
+        if name not in get_serializer(model).names:
+            raise InvalidQuery(f"Cannot sort {model.__tablename__} by unknown column {name}")
+        return model.__table__.c[name], sort.startswith("-")
+    
+    def _order_rows(self, query, model, sort, cursor=None):
+        """
+        Order a query for keyset pagination and skip to the position in cursor.
+        
+        Rows are ordered by the sort column with NULLs last and then by id in
+        the same direction, so (value, id) identifies a unique position.
+        """
+        column, descending = self._sort_column(model, sort)
+        if column is None:
+            query = query.order_by(model.id)
+        else:
+            direction = (lambda c: c.desc()) if descending else (lambda c: c.asc())
+            query = query.order_by(column.is_(None), direction(column), direction(model.id))
+        
+        if cursor is None:
+            return query
+        
+        position = decode_cursor(cursor)
+        after_id = position.get("after_id")
+        if not isinstance(after_id, int) or position.get("sort") != sort:
+            raise InvalidCursor("Pagination cursor does not belong to this query")
+        if column is None:
+            return query.where(model.id > after_id)
+        
+        after_row = model.id < after_id if descending else model.id > after_id
+        value = position.get("value")
+        if value is None:
+            return query.where(column.is_(None), after_row)
+        value = self._cursor_value(column, value)
+        beyond = column < value if descending else column > value
+        return query.where(or_(beyond, and_(column == value, after_row), column.is_(None)))
+    
+    @staticmethod
+    def _cursor_value(column, value):
+        # Cursors carry dates as ISO strings, bind them with the column's type again
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(column.type, Date):
+            return date.fromisoformat(value)
+        return value
+    
+    def get_table_data(self, table_name, limit=None, offset=0, cursor=None, include_total=False,
+                       fields=None, filters=None, sort=None, exact=False):
+        """
+        Get a page of rows from a table, optionally projected, filtered and sorted.
+        
+        A cursor resumes after the last row of the previous page with a keyset
+        condition on (sort column, id), so deep pages cost the same as the
+        first one. offset is still honoured when no cursor is given. The total
+        is only returned when include_total is set; for an unfiltered table it
+        comes from the row counter unless exact is set.
+        """
+        model = self.get_table_class(table_name)
+        if model is None:
+            raise ValueError(f"Table {table_name} not found")
+        
+        query = self._table_query(model, fields, filters, sort)
+        page = self._order_rows(query, model, sort, cursor)
+        if cursor is None and offset:
+            page = page.offset(offset)
+        
+        # Fetch one extra row to know whether another page follows
+        if limit is not None:
+            page = page.limit(limit + 1)
+        
+        rows = [dict(row._mapping) for row in self.db.execute(page)]
+        has_more = limit is not None and len(rows) > limit
+        next_cursor = None
+        if has_more:
+            rows = rows[:limit]
+            position = {"after_id": rows[-1]["id"], "sort": sort}
+            if sort:
+                position["value"] = rows[-1][sort.lstrip("-")]
+            next_cursor = encode_cursor(**position)
+        
+        total = None
+        if include_total:
+            unfiltered = model is not User and not any(value is not None for value in (filters or {}).values())
+            if unfiltered and not exact:
+                total = get_row_count(self.db, model)[0]
             else:
-                query = query.offset(offset)  # No limit, fetch all after offset
-                
-            # Execute query and convert results to dictionaries
-            results = query.all()
-            return [row.__dict__ for row in results]
-        except Exception as e:
-            self.logger.error(f"Error getting data from {table_name}: {str(e)}")
-            raise
-
-    def get_table_count(self, table_name: str):
+                total = self.db.execute(select(func.count()).select_from(query.subquery())).scalar()
+        
+        return {
+            "data": rows,
+            "pagination": {
+                "limit": limit,
+                "offset": offset if cursor is None else None,
+                "next_cursor": next_cursor,
+                "has_more": has_more,
+                "total": total
+            }
+        }
+    
+    def stream_table(self, table_name: str, fmt: str, fields=None, filters=None, sort=None):
+        """
+        Return a generator that writes every matching row of a table as NDJSON or CSV.
+        
+        Rows are read in batches of EXPORT_BATCH_ROWS through a server-side
+        cursor on a connection owned by the generator, so memory stays flat
+        and the response can outlive the request's session.
+        """
+        model = self.get_table_class(table_name)
+        if model is None:
+            raise ValueError(f"Table {table_name} not found")
+        query = self._order_rows(self._table_query(model, fields, filters, sort), model, sort)
+        columns = [column.name for column in query.selected_columns]
+        
+        def generate():
+            if fmt == "csv":
+                yield _csv_lines([columns])
+            with engine.connect() as connection:
+                result = connection.execution_options(
+                    stream_results=True, yield_per=settings.EXPORT_BATCH_ROWS
+                ).execute(query)
+                for batch in result.partitions():
+                    if fmt == "csv":
+                        yield _csv_lines(batch)
+                    else:
+                        yield dumps_lines(columns, batch)
+        
+        return generate()
+    
+    def get_table_count(self, table_name: str, exact: bool = False):
         """
-        Get the total number of records in a table
+        Get the total number of records in a table, from its row counter unless exact is set
         """
         table_class = self.get_table_class(table_name)
         if not table_class:
             raise ValueError(f"Table {table_name} not found")
         
-        return self.db.query(func.count()).select_from(table_class).scalar()
+        return get_row_count(self.db, table_class, exact)[0]
 
     def get_employee_data(self, table_name: str, employee_id: str) -> List[Dict[str, Any]]:
         """
@@ -693,146 +924,19 @@ class CSVProcessor:
             raise ValueError(f"Unknown table: {table_name}")
         
         model = self.table_models[table_name]
-        
-        # Get all records for this employee
-        records = self.db.query(model).filter(model.employee_id == employee_id).all()
-        
-        # Convert to dict
-        result = []
-        for record in records:
-            item = {}
-            for column in inspect(model).c.keys():
-                item[column] = getattr(record, column)
-            result.append(item)
-            
-        return result
+        return get_serializer(model).fetch_dicts(self.db, model.employee_id == employee_id, order_by=model.id)
     
     def queue_user_creation_after_csv_jobs(self, csv_job_ids, batch_id):
-        """Queue user creation to run after all CSV jobs complete"""
-        job_id = str(uuid.uuid4())
-        
-        def wait_and_create_users():
-            try:
-                # Create a new session for this thread
-                from app.core.database import SessionLocal
-                db = SessionLocal()
-                
-                # First, wait for all CSV jobs to complete
-                logger.info(f"Waiting for {len(csv_job_ids)} CSV jobs to complete before creating users")
-                
-                # Update job status to waiting
-                background_jobs[job_id] = {
-                    "status": "waiting",
-                    "message": f"Waiting for {len(csv_job_ids)} CSV jobs to complete",
-                    "csv_jobs": csv_job_ids,
-                    "batch_id": batch_id,
-                    "started_at": datetime.now().isoformat()
-                }
-                
-                # Check if all CSV jobs are complete
-                all_complete = False
-                max_wait_time = 300  # Maximum wait time in seconds
-                wait_start = datetime.now()
-                
-                while not all_complete:
-                    # Check if we've waited too long
-                    wait_duration = (datetime.now() - wait_start).total_seconds()
-                    if wait_duration > max_wait_time:
-                        logger.warning(f"Timed out waiting for CSV jobs after {wait_duration} seconds")
-                        background_jobs[job_id] = {
-                            "status": "failed",
-                            "message": f"Timed out waiting for CSV jobs after {wait_duration} seconds",
-                            "csv_jobs": csv_job_ids,
-                            "completed_at": datetime.now().isoformat()
-                        }
-                        return
-                    
-                    # Check status of all CSV jobs
-                    completed_jobs = 0
-                    failed_jobs = 0
-                    
-                    for csv_job_id in csv_job_ids:
-                        if csv_job_id in background_jobs:
-                            job_status = background_jobs[csv_job_id]["status"]
-                            if job_status == "completed":
-                                completed_jobs += 1
-                            elif job_status == "failed":
-                                failed_jobs += 1
-                    
-                    # If all jobs have a final status, we can proceed
-                    if completed_jobs + failed_jobs == len(csv_job_ids):
-                        all_complete = True
-                        logger.info(f"All CSV jobs complete: {completed_jobs} succeeded, {failed_jobs} failed")
-                    else:
-                        # Wait a bit before checking again
-                        import time
-                        time.sleep(2)
-                
-                # Update status to processing before starting user creation
-                background_jobs[job_id] = {
-                    "status": "processing",
-                    "message": "Creating users from employee IDs",
-                    "csv_jobs_completed": completed_jobs,
-                    "csv_jobs_failed": failed_jobs,
-                    "batch_id": batch_id
-                }
-                
-                # Now create the users
-                processor = CSVProcessor(db)
-                
-                try:
-                    # Use the existing method that implements multiprocessing
-                    result = processor.create_users_from_employee_ids()
-                    
-                    # Update job status
-                    background_jobs[job_id] = {
-                        "status": "completed",
-                        "result": result,
-                        "completed_at": datetime.now().isoformat(),
-                        "batch_id": batch_id
-                    }
-                    
-                    logger.info(f"Created {result['employees_created']} employee records and {result['users_created']} user accounts")
-                    
-                except Exception as e:
-                    logger.error(f"Error in user creation process: {str(e)}")
-                    background_jobs[job_id] = {
-                        "status": "failed",
-                        "error": str(e),
-                        "completed_at": datetime.now().isoformat(),
-                        "batch_id": batch_id
-                    }
-                    # Rollback in case of error
-                    db.rollback()
-                
-                finally:
-                    # Always close the session
-                    db.close()
-                    
-            except Exception as e:
-                logger.error(f"Failed to create database session: {str(e)}")
-                background_jobs[job_id] = {
-                    "status": "failed",
-                    "error": f"Database connection error: {str(e)}",
-                    "completed_at": datetime.now().isoformat(),
-                    "batch_id": batch_id
-                }
-        
-        # Initialize job status
-        background_jobs[job_id] = {
-            "status": "queued",
-            "message": "Waiting for CSV processing to complete",
-            "csv_jobs": csv_job_ids,
-            "batch_id": batch_id,
-            "queued_at": datetime.now().isoformat()
-        }
-        
-        # Start background thread
-        thread = threading.Thread(target=wait_and_create_users)
-        thread.daemon = True
-        thread.start()
+        """Queue user creation to start as soon as all CSV jobs have finished"""
+        job_id = create_job(
+            "create_users",
+            depends_on=csv_job_ids,
+            message=f"Waiting for {len(csv_job_ids)} CSV jobs to complete",
+            batch_id=batch_id
+        )
+        logger.info(f"User creation job {job_id} will run after {len(csv_job_ids)} CSV jobs")
         
-        return {"job_id": job_id, "status": "queued", "type": "create_users", "batch_id": batch_id}
+        return {"job_id": job_id, "status": JobStatus.WAITING.value, "type": "create_users", "batch_id": batch_id}
     
     def get_table_class(self, table_name: str):
         """Get the model class associated with a table name"""
@@ -864,3 +968,6 @@ class CSVProcessor:
         # If table is not found, return None
         logger.warning(f"Table model not found for: {table_name}")
         return None
+
+
+register_job_runner("create_users", CSVProcessor._start_user_creation_job)
@@ -0,0 +1,39 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.table_stats import DataVersion
+from app.services.bulk_insert import dialect_insert
+
+
+def bump_data_version(db: Session, *table_names: str) -> None:
+    """Increment the change counters of tables inside the caller's transaction"""
+    if not table_names:
+        return
+    table = DataVersion.__table__
+    statement = dialect_insert(db, table)
+    db.execute(
+        statement.on_conflict_do_update(index_elements=["table_name"], set_={"version": table.c.version + 1}),
+        # Sorted so writers bumping several tables lock the rows in the same order
+        [{"table_name": table_name, "version": 1} for table_name in sorted(set(table_names))]
+    )
+
+
+def _versions_query(table_names):
+    return select(DataVersion.table_name, DataVersion.version).where(DataVersion.table_name.in_(table_names))
+
+
+def get_data_versions(db: Session, table_names: Iterable[str]) -> Dict[str, int]:
+    """Current change counter of each table, 0 for tables never written since the counters existed"""
+    table_names = list(table_names)
+    versions = dict(db.execute(_versions_query(table_names)).all())
+    return {table_name: versions.get(table_name, 0) for table_name in table_names}
+
+
+async def get_data_versions_async(db: AsyncSession, table_names: Iterable[str]) -> Dict[str, int]:
+    """get_data_versions on an async session"""
+    table_names = list(table_names)
+    versions = dict((await db.execute(_versions_query(table_names))).all())
+    return {table_name: versions.get(table_name, 0) for table_name in table_names}
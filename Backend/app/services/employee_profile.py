@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.activity import ActivityTracker
+from app.models.leave import LeaveTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.vibemeter import VibeMeter
+from app.services.bulk_insert import is_postgresql
+from app.services.data_versions import get_data_versions, get_data_versions_async
+from app.services.row_serializer import dumps, get_serializer
+
+logger = logging.getLogger(__name__)
+
+# Response key and table for each section of the employee profile, in response order
+PROFILE_SECTIONS = (
+    ("activities", ActivityTracker),
+    ("mood", VibeMeter),
+    ("leaves", LeaveTracker),
+    ("performance", PerformanceTracker),
+    ("rewards", RewardsTracker),
+)
+
+PROFILE_TABLES = tuple(sorted(model.__tablename__ for _, model in PROFILE_SECTIONS))
+
+
+def _section_select(db: Session, position: int, model, employee_id: str):
+    """Select one section's rows as (section position, id, JSON object)"""
+    build = func.json_build_object if is_postgresql(db) else func.json_object
+    arguments = []
+    for column in get_serializer(model).columns:
+        arguments.extend((literal(column.name), column))
+    return select(
+        literal(position).label("section"),
+        model.id.label("row_id"),
+        build(*arguments).label("payload")
+    ).where(model.employee_id == employee_id)
+
+
+def _profile_query(db, employee_id: str):
+    """UNION ALL of every profile section of an employee, in response order"""
+    return union_all(*(
+        _section_select(db, position, model, employee_id)
+        for position, (_, model) in enumerate(PROFILE_SECTIONS)
+    )).order_by("section", "row_id")
+
+
+def _profile_body(employee_id: str, rows) -> bytes:
+    """Join the JSON fragments of the profile rows into the response body"""
+    sections = [[] for _ in PROFILE_SECTIONS]
+    for position, _, payload in rows:
+        # psycopg2 decodes json columns, SQLite and asyncpg return the text
+        sections[position].append(payload if isinstance(payload, str) else dumps(payload).decode())
+
+    body = ['{"employee_id":', dumps(employee_id).decode()]
+    for (key, _), section_rows in zip(PROFILE_SECTIONS, sections):
+        body.append(f',"{key}":[{",".join(section_rows)}]')
+    body.append("}")
+    return "".join(body).encode()
+
+
+def load_employee_profile(db: Session, employee_id: str) -> bytes:
+    """
+    Read every profile section of an employee in one round trip.
+
+    The five tables are read with a single UNION ALL, each row is rendered
+    to JSON by the database, and the fragments are joined into the response
+    body without building Python objects for the rows.
+    """
+    return _profile_body(employee_id, db.execute(_profile_query(db, employee_id)))
+
+
+async def load_employee_profile_async(db: AsyncSession, employee_id: str) -> bytes:
+    """load_employee_profile on an async session"""
+    return _profile_body(employee_id, await db.execute(_profile_query(db, employee_id)))
+
+
+class ProfileCache:
+    """
+    Per-employee cache of encoded profile responses with a TTL.
+
+    Each entry is stamped with the data versions of the profile tables it
+    was loaded from and is served only while those versions are current.
+    The versions live in the database, so a write through any worker
+    retires the entries of every worker.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, employee_id: str, versions: tuple) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(employee_id)
+            if entry is None:
+                return None
+            expires_at, entry_versions, body = entry
+            if expires_at < time.monotonic() or entry_versions != versions:
+                del self._entries[employee_id]
+                return None
+            self._entries.move_to_end(employee_id)
+            return body
+
+    def put(self, employee_id: str, versions: tuple, body: bytes) -> None:
+        with self._lock:
+            self._entries[employee_id] = (time.monotonic() + self.ttl_seconds, versions, body)
+            self._entries.move_to_end(employee_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+profile_cache = ProfileCache(settings.EMPLOYEE_PROFILE_CACHE_TTL, settings.EMPLOYEE_PROFILE_CACHE_SIZE)
+
+
+def _stamp(versions: dict) -> tuple:
+    return tuple(sorted(versions.items()))
+
+
+def get_employee_profile(db: Session, employee_id: str) -> bytes:
+    """Return the encoded profile of an employee, from the cache while the profile tables are unchanged"""
+    if not profile_cache.enabled:
+        return load_employee_profile(db, employee_id)
+    # Read before loading, a write committed meanwhile leaves the entry stamped as older than its content
+    versions = _stamp(get_data_versions(db, PROFILE_TABLES))
+    body = profile_cache.get(employee_id, versions)
+    if body is None:
+        body = load_employee_profile(db, employee_id)
+        profile_cache.put(employee_id, versions, body)
+    return body
+
+
+async def get_employee_profile_async(db: Union[Session, AsyncSession], employee_id: str) -> bytes:
+    """get_employee_profile on an async session, or off the event loop on a sync one"""
+    if not isinstance(db, AsyncSession):
+        return await run_in_threadpool(get_employee_profile, db, employee_id)
+    if not profile_cache.enabled:
+        return await load_employee_profile_async(db, employee_id)
+    versions = _stamp(await get_data_versions_async(db, PROFILE_TABLES))
+    body = profile_cache.get(employee_id, versions)
+    if body is None:
+        body = await load_employee_profile_async(db, employee_id)
+        profile_cache.put(employee_id, versions, body)
+    return body
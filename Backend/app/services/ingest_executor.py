@@ -0,0 +1,131 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue has no room for another task"""
+    pass
+
+
+class IngestExecutor:
+    """
+    Shared, bounded executor for CSV ingest work.
+
+    Database writes run on a small thread pool so they stay within the
+    SQLAlchemy connection pool, CPU-heavy parsing runs on a process pool.
+    At most db_workers tasks run at once and queue_size more may wait,
+    anything beyond that is rejected with IngestQueueFull. Follow-up tasks
+    that must not be dropped are held back instead, see submit_deferred.
+    """
+
+    def __init__(self, db_workers: int, parse_workers: int, queue_size: int):
+        self.db_workers = max(1, db_workers)
+        self.parse_workers = max(0, parse_workers)
+        self.capacity = self.db_workers + max(0, queue_size)
+
+        self._db_pool = ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix="ingest-db")
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Tasks waiting for a free slot, handed the slot of the next task to finish
+        self._deferred = deque()
+
+    def available_slots(self) -> int:
+        """Number of tasks that can still be queued"""
+        with self._lock:
+            return max(0, self.capacity - self._in_flight - len(self._deferred))
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue a database-bound task, raising IngestQueueFull when the queue is full"""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise IngestQueueFull(f"Ingest queue is full ({self.capacity} tasks)")
+            self._in_flight += 1
+        return self._start(fn, args, kwargs)
+
+    def submit_deferred(self, fn, *args, **kwargs) -> None:
+        """Queue a database-bound task, or hold it until a slot frees up when the queue is full"""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._deferred.append((fn, args, kwargs))
+                return
+            self._in_flight += 1
+        self._start(fn, args, kwargs)
+
+    def _start(self, fn, args, kwargs) -> Future:
+        future = self._db_pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def submit_parse(self, fn, *args) -> Future:
+        """Run a CPU-bound parse step on the process pool, or inline if it is disabled"""
+        if self.parse_workers == 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            if self._parse_pool is None:
+                # Spawned workers do not inherit the server's threads or open connections
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._parse_pool.submit(fn, *args)
+
+    def shutdown(self):
+        """Stop accepting work and wait for running tasks"""
+        self._db_pool.shutdown(wait=True)
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=True)
+
+    def _task_done(self, future: Future):
+        with self._lock:
+            deferred = self._deferred.popleft() if self._deferred else None
+            if deferred is None:
+                self._in_flight -= 1
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Ingest task failed: {str(future.exception())}")
+        if deferred is not None:
+            try:
+                self._start(*deferred)
+            except RuntimeError as e:
+                # Shutting down, the task's job is failed once it goes stale
+                with self._lock:
+                    self._in_flight -= 1
+                logger.error(f"Dropped a deferred ingest task: {str(e)}")
+
+
+_executor: Optional[IngestExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_ingest_executor() -> IngestExecutor:
+    """Return the process-wide ingest executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = IngestExecutor(
+                    db_workers=settings.INGEST_DB_WORKERS,
+                    parse_workers=settings.INGEST_PARSE_WORKERS,
+                    queue_size=settings.INGEST_QUEUE_SIZE
+                )
+    return _executor
+
+
+def shutdown_ingest_executor():
+    """Shut down the ingest executor if it was started"""
+    if _executor is not None:
+        _executor.shutdown()
@@ -0,0 +1,325 @@
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.background_job import BackgroundJob, JobDependency, JobStatus
+from app.models.ingested_file import IngestedFile, IngestStatus
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+# Statuses of jobs handed to a worker pool, which refreshes their updated_at while it is alive
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+# Callables that start a job of a given type once its dependencies have finished
+_job_runners: Dict[str, Callable[[str], None]] = {}
+
+# Queued and running jobs of this process, kept fresh by the job monitor
+_local_jobs: Set[str] = set()
+_local_jobs_lock = threading.Lock()
+
+_monitor: Optional[threading.Thread] = None
+_monitor_stop = threading.Event()
+
+
+def _track_job(job_id: str) -> None:
+    with _local_jobs_lock:
+        _local_jobs.add(job_id)
+
+
+def _untrack_job(job_id: str) -> None:
+    with _local_jobs_lock:
+        _local_jobs.discard(job_id)
+
+
+def register_job_runner(job_type: str, runner: Callable[[str], None]) -> None:
+    """Register the function that starts waiting jobs of a type when they become ready"""
+    _job_runners[job_type] = runner
+
+
+def create_job(job_type: str, status: JobStatus = JobStatus.QUEUED, depends_on: Optional[Iterable[str]] = None, **fields) -> str:
+    """
+    Persist a new background job and return its ID.
+    
+    A job with depends_on is stored as WAITING and started by its registered
+    runner as soon as every job it depends on has finished.
+    """
+    job_id = str(uuid.uuid4())
+    now = datetime.now()
+    if depends_on is not None:
+        depends_on = list(dict.fromkeys(depends_on))
+        status = JobStatus.WAITING
+    
+    with SessionLocal() as db:
+        db.add(BackgroundJob(id=job_id, job_type=job_type, status=status, start_time=now, updated_at=now, **fields))
+        db.add_all(JobDependency(job_id=job_id, depends_on_id=dependency) for dependency in depends_on or [])
+        db.commit()
+        prune_jobs(db)
+    if status in ACTIVE_STATUSES:
+        _track_job(job_id)
+    
+    # The dependencies may all have finished before the edges were committed
+    if depends_on is not None:
+        start_if_ready(job_id)
+    return job_id
+
+
+def update_job(job_id: str, status: Optional[JobStatus] = None, message: Optional[str] = None, **fields) -> None:
+    """Update the status, message and progress fields of a job"""
+    values: Dict[str, Any] = dict(fields)
+    values["updated_at"] = datetime.now()
+    if status is not None:
+        values["status"] = status
+        if status in FINAL_STATUSES:
+            values["end_time"] = values["updated_at"]
+    if message is not None:
+        values["message"] = message
+
+    try:
+        with SessionLocal() as db:
+            db.query(BackgroundJob).filter(BackgroundJob.id == job_id).update(values)
+            db.commit()
+    except Exception as e:
+        logger.error(f"Error updating job {job_id} status: {str(e)}")
+        return
+    
+    if status in FINAL_STATUSES:
+        _untrack_job(job_id)
+        start_ready_dependents(job_id)
+
+
+def start_ready_dependents(job_id: str) -> None:
+    """Start every job waiting on job_id whose other dependencies have also finished"""
+    with SessionLocal() as db:
+        dependents = [
+            row.job_id for row in
+            db.query(JobDependency.job_id).filter(JobDependency.depends_on_id == job_id).all()
+        ]
+    for dependent_id in dependents:
+        start_if_ready(dependent_id)
+
+
+def start_if_ready(job_id: str) -> bool:
+    """
+    Hand a waiting job to its runner once all of its dependencies are final.
+    
+    The WAITING -> QUEUED transition is a conditional UPDATE, so when the last
+    dependencies finish concurrently, in any worker, exactly one of them
+    starts the job.
+    """
+    with SessionLocal() as db:
+        unfinished = db.query(JobDependency).join(
+            BackgroundJob, BackgroundJob.id == JobDependency.depends_on_id
+        ).filter(
+            JobDependency.job_id == job_id,
+            BackgroundJob.status.notin_(FINAL_STATUSES)
+        ).count()
+        if unfinished:
+            return False
+        
+        claimed = db.query(BackgroundJob).filter(
+            BackgroundJob.id == job_id,
+            BackgroundJob.status == JobStatus.WAITING
+        ).update({"status": JobStatus.QUEUED, "updated_at": datetime.now()}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return False
+        job_type = db.get(BackgroundJob, job_id).job_type
+    _track_job(job_id)
+    
+    runner = _job_runners.get(job_type)
+    if runner is None:
+        update_job(job_id, JobStatus.FAILED, f"No runner registered for {job_type} jobs")
+        return False
+    
+    try:
+        runner(job_id)
+    except Exception as e:
+        logger.error(f"Could not start job {job_id}: {str(e)}")
+        update_job(job_id, JobStatus.FAILED, str(e))
+        return False
+    return True
+
+
+def delete_job(job_id: str) -> None:
+    """Remove a job record, used when a queued job could not be started"""
+    _untrack_job(job_id)
+    with SessionLocal() as db:
+        db.query(JobDependency).filter(JobDependency.job_id == job_id).delete()
+        db.query(BackgroundJob).filter(BackgroundJob.id == job_id).delete()
+        db.commit()
+    
+    # Jobs waiting on it must not wait forever
+    start_ready_dependents(job_id)
+
+
+def heartbeat_jobs() -> int:
+    """Refresh updated_at of the unfinished jobs queued or running in this process"""
+    with _local_jobs_lock:
+        job_ids = list(_local_jobs)
+    if not job_ids:
+        return 0
+    with SessionLocal() as db:
+        refreshed = db.query(BackgroundJob).filter(
+            BackgroundJob.id.in_(job_ids),
+            BackgroundJob.status.in_(ACTIVE_STATUSES)
+        ).update({"updated_at": datetime.now()}, synchronize_session=False)
+        db.commit()
+    return refreshed
+
+
+def fail_stale_jobs() -> List[str]:
+    """
+    Fail queued and running jobs that nobody refreshed for JOB_STALE_SECONDS.
+    
+    The process that owned them stopped, so they would never finish. Their
+    file claims are marked failed so the files can be uploaded again, and
+    jobs waiting on them are started.
+    """
+    now = datetime.now()
+    cutoff = now - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    last_seen = func.coalesce(BackgroundJob.updated_at, BackgroundJob.start_time)
+    with SessionLocal() as db:
+        stale = [
+            row.id for row in
+            db.query(BackgroundJob.id).filter(BackgroundJob.status.in_(ACTIVE_STATUSES), last_seen < cutoff).all()
+        ]
+        if not stale:
+            return []
+        failed = []
+        for job_id in stale:
+            # Conditional on the same test, a heartbeat may have landed since the read
+            if db.query(BackgroundJob).filter(
+                BackgroundJob.id == job_id,
+                BackgroundJob.status.in_(ACTIVE_STATUSES),
+                last_seen < cutoff
+            ).update({
+                "status": JobStatus.FAILED,
+                "message": f"Worker stopped without finishing the job, no progress for {settings.JOB_STALE_SECONDS}s",
+                "end_time": now,
+                "updated_at": now
+            }, synchronize_session=False):
+                failed.append(job_id)
+        db.query(IngestedFile).filter(
+            IngestedFile.job_id.in_(failed),
+            IngestedFile.status == IngestStatus.IN_PROGRESS
+        ).update({"status": IngestStatus.FAILED}, synchronize_session=False)
+        db.commit()
+    
+    for job_id in failed:
+        logger.warning(f"Failed stale job {job_id}")
+        _untrack_job(job_id)
+        start_ready_dependents(job_id)
+    return failed
+
+
+def _monitor_jobs() -> None:
+    while not _monitor_stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+        try:
+            heartbeat_jobs()
+            fail_stale_jobs()
+        except Exception:
+            logger.exception("Job monitor pass failed")
+
+
+def start_job_monitor() -> None:
+    """Fail jobs left behind by stopped workers, then keep this process's jobs fresh in the background"""
+    global _monitor
+    if _monitor is not None:
+        return
+    try:
+        fail_stale_jobs()
+    except Exception:
+        logger.exception("Failing stale jobs at startup failed")
+    _monitor_stop.clear()
+    _monitor = threading.Thread(target=_monitor_jobs, name="job-monitor", daemon=True)
+    _monitor.start()
+
+
+def stop_job_monitor() -> None:
+    """Stop the job monitor thread if it was started"""
+    global _monitor
+    if _monitor is None:
+        return
+    _monitor_stop.set()
+    _monitor.join()
+    _monitor = None
+
+
+def prune_jobs(db: Session) -> int:
+    """Delete finished jobs older than the retention window"""
+    cutoff = datetime.now() - timedelta(hours=settings.JOB_RETENTION_HOURS)
+    expired = db.query(BackgroundJob.id).filter(
+        BackgroundJob.status.in_(FINAL_STATUSES),
+        BackgroundJob.end_time < cutoff
+    )
+    db.query(JobDependency).filter(JobDependency.job_id.in_(expired.scalar_subquery())).delete(synchronize_session=False)
+    deleted = db.query(BackgroundJob).filter(BackgroundJob.id.in_(expired.scalar_subquery())).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def get_dependencies(db: Session, job_ids: List[str]) -> Dict[str, List[str]]:
+    """Map each job ID to the IDs of the jobs it waits on"""
+    dependencies: Dict[str, List[str]] = {job_id: [] for job_id in job_ids}
+    if job_ids:
+        rows = db.query(JobDependency).filter(JobDependency.job_id.in_(job_ids)).all()
+        for row in rows:
+            dependencies[row.job_id].append(row.depends_on_id)
+    return dependencies
+
+
+def job_to_dict(job: BackgroundJob, depends_on: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Serialize a job with its throughput and estimated time remaining"""
+    finished = job.status in FINAL_STATUSES
+    elapsed = ((job.end_time if finished else datetime.now()) - job.start_time).total_seconds()
+    rows_per_sec = round(job.rows_processed / elapsed, 1) if job.rows_processed and elapsed > 0 else None
+
+    # Estimate the remaining time from the share of the file read so far
+    eta_seconds = None
+    if not finished and job.bytes_total and job.bytes_read and elapsed > 0:
+        bytes_per_sec = job.bytes_read / elapsed
+        eta_seconds = round((job.bytes_total - job.bytes_read) / bytes_per_sec, 1)
+
+    return {
+        "job_id": job.id,
+        "type": job.job_type,
+        "status": job.status.value if job.status else None,
+        "message": job.message,
+        "filename": job.filename,
+        "table": job.table_name,
+        "batch_id": job.batch_id,
+        "rows_processed": job.rows_processed,
+        "bytes_read": job.bytes_read,
+        "bytes_total": job.bytes_total,
+        "rows_per_sec": rows_per_sec,
+        "eta_seconds": eta_seconds,
+        "result": job.result,
+        "depends_on": depends_on or [],
+        "started_at": job.start_time.isoformat() if job.start_time else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "completed_at": job.end_time.isoformat() if job.end_time else None,
+    }
+
+
+def get_job(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a job by ID"""
+    job = db.get(BackgroundJob, job_id)
+    if job is None:
+        return None
+    return job_to_dict(job, get_dependencies(db, [job_id])[job_id])
+
+
+def list_jobs(db: Session, limit: int = 200) -> List[Dict[str, Any]]:
+    """Return the most recent jobs, newest first"""
+    jobs = db.query(BackgroundJob).order_by(BackgroundJob.start_time.desc()).limit(limit).all()
+    dependencies = get_dependencies(db, [job.id for job in jobs])
+    return [job_to_dict(job, dependencies[job.id]) for job in jobs]
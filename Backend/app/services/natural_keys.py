@@ -0,0 +1,73 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.activity import ActivityTracker
+from app.models.leave import LeaveTracker
+from app.models.onboarding import OnboardingTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.vibemeter import VibeMeter
+from app.services.bulk_insert import natural_key_index_name
+from app.services.data_versions import bump_data_version
+from app.services.report_summary import apply_summary_rows
+from app.services.row_counts import adjust_row_count
+
+logger = logging.getLogger(__name__)
+
+# Tracker tables that upsert on their NATURAL_KEY
+NATURAL_KEY_MODELS = (ActivityTracker, LeaveTracker, OnboardingTracker, PerformanceTracker, RewardsTracker, VibeMeter)
+
+
+def delete_duplicate_keys(db: Session, model) -> List[Dict[str, Any]]:
+    """Delete every row whose natural key also occurs on a newer row, returns the deleted rows"""
+    table = model.__table__
+    keys = [table.c[column] for column in model.NATURAL_KEY]
+    # Rows with a NULL key column never conflict in a unique index
+    complete_key = and_(*(key.is_not(None) for key in keys))
+    newest = select(func.max(table.c.id)).where(complete_key).group_by(*keys)
+    statement = delete(table).where(complete_key, table.c.id.not_in(newest)).returning(*table.c)
+    return [dict(row) for row in db.execute(statement).mappings()]
+
+
+def sync_natural_key_indexes(db: Session, mode: Optional[str] = None) -> Dict[str, int]:
+    """
+    Create or drop the natural key unique indexes to match the ingest upsert mode.
+
+    "ignore" and "update" need the indexes for ON CONFLICT. Rows loaded in
+    append mode may repeat a key, so those are deleted first, keeping the
+    newest row of each key. "append" drops the indexes so repeated rows can
+    be stored again. Runs once at startup in its own transaction and returns
+    the duplicate rows deleted per table.
+    """
+    mode = mode or settings.INGEST_UPSERT_MODE
+    deleted = {}
+    for model in NATURAL_KEY_MODELS:
+        table_name = model.__tablename__
+        index_name = natural_key_index_name(table_name)
+        exists = index_name in {index["name"] for index in inspect(db.connection()).get_indexes(table_name)}
+
+        if mode == "append":
+            if exists:
+                db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+                logger.info(f"Dropped {index_name}, INGEST_UPSERT_MODE is append")
+            continue
+        if exists:
+            continue
+
+        rows = delete_duplicate_keys(db, model)
+        deleted[table_name] = len(rows)
+        if rows:
+            logger.warning(f"Deleted {len(rows)} rows of {table_name} repeating a natural key")
+            adjust_row_count(db, table_name, -len(rows))
+            apply_summary_rows(db, table_name, [], removed=rows)
+            bump_data_version(db, table_name)
+        columns = ", ".join(f'"{column}"' for column in model.NATURAL_KEY)
+        db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"))
+        logger.info(f"Created {index_name}")
+
+    db.commit()
+    return deleted
@@ -0,0 +1,32 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict
+
+
+class InvalidQuery(ValueError):
+    """Raised when table query parameters do not fit the table"""
+    pass
+
+
+class InvalidCursor(InvalidQuery):
+    """Raised when a pagination cursor cannot be decoded"""
+    pass
+
+
+def encode_cursor(**position: Any) -> str:
+    """Pack the position of the last row on a page into an opaque URL-safe token"""
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Unpack a token produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Malformed pagination cursor")
+    if not isinstance(position, dict):
+        raise InvalidCursor("Malformed pagination cursor")
+    return position
@@ -0,0 +1,99 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.activity import ActivityTracker
+from app.models.employee import Employee
+from app.models.leave import LeaveTracker
+from app.models.onboarding import OnboardingTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.user import User
+from app.models.vibemeter import VibeMeter
+from app.services.data_versions import get_data_versions
+from app.services.row_serializer import dumps
+
+logger = logging.getLogger(__name__)
+
+# Every table a report reads, a write to any of them invalidates cached reports
+REPORT_TABLES = tuple(sorted(model.__tablename__ for model in (
+    User, Employee, ActivityTracker, LeaveTracker, OnboardingTracker, PerformanceTracker, RewardsTracker, VibeMeter
+)))
+
+
+class ReportCache:
+    """
+    Encoded report responses keyed by report type and parameters.
+
+    Each entry is stamped with the data versions of the report tables it
+    was built from and is served only while those versions are current.
+    The versions live in the database, so every worker agrees on them and
+    on the ETags derived from them.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, etag: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+report_cache = ReportCache(settings.REPORT_CACHE_SIZE)
+
+
+def report_etag(report_type: str, params: tuple, versions: dict) -> str:
+    """Strong ETag of a report for the given data versions"""
+    stamp = repr((report_type, params, sorted(versions.items())))
+    return '"' + hashlib.sha1(stamp.encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the current ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cached_report(db: Session, report_type: str, params: tuple, build: Callable[[], Any],
+                  if_none_match: Optional[str] = None) -> Tuple[str, Optional[bytes]]:
+    """
+    Return (ETag, encoded {"report": ...} body) for a report.
+
+    The body is None when the client already holds the current version,
+    in which case nothing is built. Versions are read before building, so
+    a write committed meanwhile leaves the entry stamped as older than its
+    content and it is rebuilt on the next request.
+    """
+    etag = report_etag(report_type, params, get_data_versions(db, REPORT_TABLES))
+    if etag_matches(if_none_match, etag):
+        return etag, None
+
+    key = (report_type, params)
+    body = report_cache.get(key, etag)
+    if body is None:
+        body = dumps({"report": build()})
+        report_cache.put(key, etag, body)
+    return etag, body
@@ -0,0 +1,258 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import Float, Integer, String, cast, delete, func, literal, select, text, union_all
+from sqlalchemy.orm import Session
+
+from app.models.activity import ActivityTracker
+from app.models.leave import LeaveTracker
+from app.models.onboarding import OnboardingTracker
+from app.models.performance import PerformanceTracker
+from app.models.report_aggregate import ReportAggregate
+from app.models.rewards import RewardsTracker
+from app.models.vibemeter import VibeMeter
+from app.services.bulk_insert import dialect_insert, is_postgresql
+
+logger = logging.getLogger(__name__)
+
+# Marker row present once the aggregates match the raw tables
+BUILT = "summary_built"
+
+# Per-key metrics, the key is the employee ID or the category value
+WORK_HOURS = "work_hours"
+ONBOARDING_FEEDBACK = "onboarding_feedback"
+REWARD_TYPE = "reward_type"
+
+# Work hours of all employees with activity rows, counting those employees
+EMPLOYEE_WORK_HOURS = "employee_work_hours"
+
+SUMMARY_TABLES = frozenset({
+    ActivityTracker.__tablename__,
+    LeaveTracker.__tablename__,
+    OnboardingTracker.__tablename__,
+    PerformanceTracker.__tablename__,
+    RewardsTracker.__tablename__,
+    VibeMeter.__tablename__,
+})
+
+
+def _column(frame: pd.DataFrame, name: str) -> pd.Series:
+    """A frame column, all missing when the upload did not have it"""
+    return frame[name] if name in frame else pd.Series([None] * len(frame), index=frame.index, dtype=object)
+
+
+def _numeric(frame: pd.DataFrame, name: str) -> pd.Series:
+    return pd.to_numeric(_column(frame, name), errors="coerce")
+
+
+def _metric(metric: str, total: float = 0.0, count: int = 0, key: str = "") -> Dict[str, Any]:
+    return {"metric": metric, "key": key, "total": float(total), "count": int(count)}
+
+
+def _histogram(metric: str, values: pd.Series) -> List[Dict[str, Any]]:
+    return [_metric(metric, count=count, key=str(key)) for key, count in values.value_counts().items()]
+
+
+def frame_deltas(table_name: str, frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Aggregate changes caused by appending the rows of a frame of model fields"""
+    if frame.empty:
+        return []
+    if table_name == ActivityTracker.__tablename__:
+        messages = _numeric(frame, "teams_messages_sent")
+        hours = pd.DataFrame({
+            "employee_id": _column(frame, "employee_id"),
+            "hours": _numeric(frame, "work_hours").fillna(0.0),
+        }).dropna(subset=["employee_id"])
+        per_employee = hours.groupby("employee_id")["hours"].agg(["sum", "size"])
+        return [
+            _metric("activity_rows", count=len(frame)),
+            _metric("teams_messages_sent", messages.sum(), messages.count()),
+            _metric("emails_sent", _numeric(frame, "emails_sent").sum(), _numeric(frame, "emails_sent").count()),
+            _metric("meetings_attended", _numeric(frame, "meetings_attended").sum(), _numeric(frame, "meetings_attended").count()),
+        ] + [
+            _metric(WORK_HOURS, row["sum"], row["size"], key=str(employee_id))
+            for employee_id, row in per_employee.iterrows()
+        ]
+    if table_name == LeaveTracker.__tablename__:
+        return [_metric("leave_rows", count=len(frame))]
+    if table_name == OnboardingTracker.__tablename__:
+        return _histogram(ONBOARDING_FEEDBACK, _column(frame, "onboarding_feedback").dropna())
+    if table_name == PerformanceTracker.__tablename__:
+        ratings = _numeric(frame, "rating")
+        return [_metric("rating", ratings.sum(), ratings.count())]
+    if table_name == RewardsTracker.__tablename__:
+        # NULL reward types are kept under the empty key
+        return [_metric("reward_rows", count=len(frame))] + _histogram(REWARD_TYPE, _column(frame, "reward_type").fillna(""))
+    if table_name == VibeMeter.__tablename__:
+        scores = _numeric(frame, "mood_score")
+        return [_metric("mood_score", scores.sum(), scores.count())]
+    return []
+
+
+def _merge_deltas(deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sum deltas of the same metric and key, one statement may not update a row twice"""
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for delta in deltas:
+        key = (delta["metric"], delta["key"])
+        if key in merged:
+            merged[key] = _metric(delta["metric"], merged[key]["total"] + delta["total"],
+                                  merged[key]["count"] + delta["count"], key=delta["key"])
+        else:
+            merged[key] = delta
+    return [delta for delta in merged.values() if delta["total"] or delta["count"]]
+
+
+def _upsert_deltas(db: Session, deltas: List[Dict[str, Any]]):
+    statement = dialect_insert(db, ReportAggregate.__table__)
+    return db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["metric", "key"],
+            set_={
+                "total": ReportAggregate.__table__.c.total + statement.excluded.total,
+                "count": ReportAggregate.__table__.c.count + statement.excluded.count,
+            }
+        ).returning(ReportAggregate.key, ReportAggregate.count),
+        deltas
+    ).all()
+
+
+def _add_deltas(db: Session, deltas: List[Dict[str, Any]]) -> None:
+    deltas = _merge_deltas(deltas)
+    per_employee = [delta for delta in deltas if delta["metric"] == WORK_HOURS]
+    deltas = [delta for delta in deltas if delta["metric"] != WORK_HOURS]
+    if per_employee:
+        # The per-employee rows are locked by the update, so their count before it is exact
+        added = {delta["key"]: delta["count"] for delta in per_employee}
+        employees = 0
+        for key, count in _upsert_deltas(db, per_employee):
+            before = count - added[key]
+            employees += (count > 0) - (before > 0)
+        deltas.append(_metric(EMPLOYEE_WORK_HOURS, sum(delta["total"] for delta in per_employee), employees))
+    if deltas:
+        _upsert_deltas(db, deltas)
+
+
+def _negated(deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [_metric(delta["metric"], -delta["total"], -delta["count"], key=delta["key"]) for delta in deltas]
+
+
+def _as_frame(rows) -> pd.DataFrame:
+    return rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+
+
+def apply_summary_rows(db: Session, table_name: str, rows, removed=None) -> None:
+    """
+    Add written rows (a frame of model fields or a list of dicts) to the
+    aggregates inside the caller's transaction, subtracting the removed
+    rows, such as the previous versions of rows an upsert overwrote.
+
+    Deltas are applied even before the first build, the build replaces
+    every row anyway.
+    """
+    if table_name in SUMMARY_TABLES:
+        deltas = frame_deltas(table_name, _as_frame(rows))
+        if removed is not None:
+            deltas += _negated(frame_deltas(table_name, _as_frame(removed)))
+        _add_deltas(db, deltas)
+
+
+def _aggregate_selects():
+    """One SELECT per metric computing (metric, key, total, count) from the raw tables"""
+    def row(metric, total, count, key=literal("", String)):
+        return [literal(metric, String).label("metric"), key.label("key"),
+                cast(total, Float).label("total"), cast(count, Integer).label("count")]
+
+    zero = literal(0.0, Float)
+    activity = ActivityTracker
+    return [
+        select(*row("activity_rows", zero, func.count())).select_from(activity),
+        select(*row("teams_messages_sent", func.coalesce(func.sum(activity.teams_messages_sent), 0),
+                    func.count(activity.teams_messages_sent))),
+        select(*row("emails_sent", func.coalesce(func.sum(activity.emails_sent), 0), func.count(activity.emails_sent))),
+        select(*row("meetings_attended", func.coalesce(func.sum(activity.meetings_attended), 0),
+                    func.count(activity.meetings_attended))),
+        select(*row(WORK_HOURS, func.sum(func.coalesce(activity.work_hours, 0.0)), func.count(), key=activity.employee_id))
+        .where(activity.employee_id.isnot(None)).group_by(activity.employee_id),
+        select(*row(EMPLOYEE_WORK_HOURS, func.coalesce(func.sum(func.coalesce(activity.work_hours, 0.0)), 0),
+                    func.count(activity.employee_id.distinct())))
+        .where(activity.employee_id.isnot(None)),
+        select(*row("leave_rows", zero, func.count())).select_from(LeaveTracker),
+        select(*row(ONBOARDING_FEEDBACK, zero, func.count(), key=OnboardingTracker.onboarding_feedback))
+        .where(OnboardingTracker.onboarding_feedback.isnot(None)).group_by(OnboardingTracker.onboarding_feedback),
+        select(*row("rating", func.coalesce(func.sum(PerformanceTracker.rating), 0), func.count(PerformanceTracker.rating))),
+        select(*row("reward_rows", zero, func.count())).select_from(RewardsTracker),
+        select(*row(REWARD_TYPE, zero, func.count(), key=func.coalesce(RewardsTracker.reward_type, "")))
+        .group_by(func.coalesce(RewardsTracker.reward_type, "")),
+        select(*row("mood_score", func.coalesce(func.sum(VibeMeter.mood_score), 0), func.count(VibeMeter.mood_score))),
+        select(*row(BUILT, zero, literal(1))),
+    ]
+
+
+class SummaryNotBuilt(RuntimeError):
+    """The aggregates were never built, run rebuild_report_summary.py or ingest a file"""
+
+
+def summary_is_built(db: Session) -> bool:
+    return db.query(ReportAggregate.metric).filter(ReportAggregate.metric == BUILT).first() is not None
+
+
+def rebuild_summary(db: Session) -> int:
+    """
+    Recompute every aggregate from the raw tables and commit.
+
+    Writers are held off while the rebuild runs, so rows committed during
+    it are neither missed nor counted twice.
+    """
+    if is_postgresql(db):
+        # Conflicts with the row locks taken by writers adding deltas
+        db.execute(text(f"LOCK TABLE {ReportAggregate.__tablename__} IN EXCLUSIVE MODE"))
+    # On SQLite the DELETE takes the write lock before the raw tables are read
+    db.execute(delete(ReportAggregate))
+    columns = ["metric", "key", "total", "count"]
+    db.execute(ReportAggregate.__table__.insert().from_select(columns, union_all(*_aggregate_selects())))
+    rows = db.query(func.count()).select_from(ReportAggregate).scalar()
+    db.commit()
+    logger.info(f"Rebuilt report aggregates, {rows} rows")
+    return rows
+
+
+def ensure_summary_built(db: Session) -> None:
+    """Build the aggregates on the first ingest, reading them never does"""
+    if not summary_is_built(db):
+        rebuild_summary(db)
+
+
+def read_summary(db: Session) -> Dict[str, Any]:
+    """
+    Return the org-level aggregates, raises SummaryNotBuilt when they were never built.
+
+    The result maps each metric to its (total, count), and the per-key
+    metrics to a dict of key to count. Per-employee work hours are returned
+    as their average.
+    """
+    rows = db.execute(
+        select(ReportAggregate.metric, ReportAggregate.key, ReportAggregate.total, ReportAggregate.count)
+        .where(ReportAggregate.metric != WORK_HOURS)
+    ).all()
+    if not any(row.metric == BUILT for row in rows):
+        raise SummaryNotBuilt("Report aggregates are not built, run rebuild_report_summary.py")
+
+    summary: Dict[str, Any] = {ONBOARDING_FEEDBACK: {}, REWARD_TYPE: {}}
+    for row in rows:
+        if row.metric in (ONBOARDING_FEEDBACK, REWARD_TYPE):
+            # Categories whose rows were all overwritten stay behind with a zero count
+            if row.count:
+                summary[row.metric][row.key] = row.count
+        else:
+            summary[row.metric] = (row.total, row.count)
+    hours, employees = summary.pop(EMPLOYEE_WORK_HOURS)
+    summary[WORK_HOURS] = hours / employees if employees else None
+    return summary
+
+
+def most_common(histogram: Dict[str, int]) -> Optional[str]:
+    """Most frequent key, ties broken alphabetically like the aggregate report"""
+    if not histogram:
+        return None
+    return min(histogram, key=lambda key: (-histogram[key], key))
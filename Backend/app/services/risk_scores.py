@@ -0,0 +1,367 @@
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, or_, select, text, union_all
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.activity import ActivityTracker
+from app.models.employee import Employee
+from app.models.employee_risk import EmployeeRisk
+from app.models.leave import LeaveTracker
+from app.models.performance import PerformanceTracker
+from app.models.rewards import RewardsTracker
+from app.models.vibemeter import VibeMeter
+from app.services.analytics_store import ColumnTable, get_store_tables
+from app.services.bulk_insert import bulk_insert_frame, dialect_insert, frame_to_records, is_postgresql
+from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Writes to these tables change somebody's score
+RISK_TABLES = frozenset(model.__tablename__ for model in (
+    ActivityTracker, Employee, LeaveTracker, PerformanceTracker, RewardsTracker, VibeMeter
+))
+
+# Component: (value of no concern, value of full concern, weight, concern when the value is missing)
+RISK_COMPONENTS = {
+    "avg_work_hours": (8.0, 10.0, 0.20, 0.5),
+    "leaves": (0.0, 3.0, 0.15, 0.0),
+    "last_rating": (4.0, 1.0, 0.20, 0.5),
+    "avg_mood": (6.0, 1.0, 0.30, 0.5),
+    "days_since_reward": (30.0, 365.0, 0.15, 1.0),
+}
+
+# Past this many touched employees a refresh recomputes everybody
+INCREMENTAL_LIMIT = 5000
+
+RISK_COLUMNS = ["employee_id", "score", *RISK_COMPONENTS, "as_of"]
+
+
+# An employee's reference date, as_of, is their latest date in any of these
+# columns. Leaves and the days since the last reward count back from it, the
+# recent work hours and mood from the employee's latest row in their own table.
+REFERENCE_COLUMNS = (ActivityTracker.date, VibeMeter.date, LeaveTracker.start_date,
+                     PerformanceTracker.review_date, RewardsTracker.date)
+
+
+def _days_before(db: Session, day, days: int):
+    """SQL expression for the date a number of days before a date column"""
+    if is_postgresql(db):
+        return day - days
+    return func.date(day, f"-{days} days")
+
+
+def _per_employee_frame(db: Session, query, names: List[str]) -> pd.DataFrame:
+    """Run an (employee_id, *values) query into a frame indexed by employee ID, without the NULL ID group"""
+    # Plain Core rows, the ORM result layer costs more than the query on large groupings
+    frame = pd.DataFrame(db.connection().execute(query).all(), columns=["employee_id", *names])
+    return frame.dropna(subset=["employee_id"]).set_index("employee_id")
+
+
+def _per_employee(db: Session, query) -> pd.Series:
+    """Run a (employee_id, value) query into a Series indexed by employee ID, without the NULL ID group"""
+    return _per_employee_frame(db, query, ["value"])["value"]
+
+
+def _sql_components(db: Session, employee_ids: Optional[List[str]]) -> Dict[str, pd.Series]:
+    """Score inputs from one grouped query per tracker table, windowed on each employee's own dates"""
+    def scope(model):
+        # An IS NOT NULL test would steer SQLite into walking the employee_id index
+        return [] if employee_ids is None else [model.employee_id.in_(employee_ids)]
+
+    latest = union_all(*(
+        select(column.class_.employee_id.label("employee_id"), func.max(column).label("as_of"))
+        .where(*scope(column.class_)).group_by(column.class_.employee_id)
+        for column in REFERENCE_COLUMNS
+    )).subquery()
+    reference = select(latest.c.employee_id, func.max(latest.c.as_of).label("as_of")) \
+        .group_by(latest.c.employee_id).subquery()
+
+    def windowed(column, days: int):
+        # Rows up to a number of days before the employee's latest date in the column's own table
+        model = column.class_
+        own = select(model.employee_id.label("employee_id"), func.max(column).label("as_of")) \
+            .where(*scope(model)).group_by(model.employee_id).subquery()
+        return select(model.employee_id).join(own, own.c.employee_id == model.employee_id) \
+            .where(*scope(model), column > _days_before(db, own.c.as_of, days)).group_by(model.employee_id)
+
+    # The reference dates take a pass over every tracker, so the leave count comes with them
+    leaves = select(reference.c.employee_id, reference.c.as_of, func.count(LeaveTracker.id)).outerjoin(
+        LeaveTracker, and_(
+            LeaveTracker.employee_id == reference.c.employee_id,
+            LeaveTracker.start_date > _days_before(db, reference.c.as_of, settings.RISK_LEAVE_DAYS)
+        )
+    ).group_by(reference.c.employee_id, reference.c.as_of)
+    reference_leaves = _per_employee_frame(db, leaves, ["as_of", "leaves"])
+
+    position = func.row_number().over(
+        partition_by=PerformanceTracker.employee_id,
+        order_by=(PerformanceTracker.review_date.desc().nulls_last(), PerformanceTracker.id)
+    ).label("row_position")
+    reviews = select(PerformanceTracker.employee_id, PerformanceTracker.rating, position).where(
+        *scope(PerformanceTracker)
+    ).subquery()
+
+    components = {
+        "avg_work_hours": windowed(ActivityTracker.date, settings.RISK_RECENT_DAYS)
+        .add_columns(func.avg(ActivityTracker.work_hours)),
+        "last_rating": select(reviews.c.employee_id, reviews.c.rating).where(reviews.c.row_position == 1),
+        "avg_mood": windowed(VibeMeter.date, settings.RISK_RECENT_DAYS).add_columns(func.avg(VibeMeter.mood_score)),
+        "last_reward": select(RewardsTracker.employee_id, func.max(RewardsTracker.date))
+        .where(*scope(RewardsTracker)).group_by(RewardsTracker.employee_id),
+    }
+    return {
+        "as_of": reference_leaves["as_of"],
+        "leaves": reference_leaves["leaves"],
+        **{name: _per_employee(db, query) for name, query in components.items()},
+    }
+
+
+def _latest_dates(table: ColumnTable, column: str) -> pd.Series:
+    """Latest date of a column per employee, NaT for employees whose rows have none"""
+    days = np.where(table.nulls[column], np.iinfo(np.int64).min, table.values[column].astype(np.int64))
+    latest = np.maximum.reduceat(days, table.offsets[:-1]) if len(days) else days
+    return pd.Series(
+        np.where(latest == np.iinfo(np.int64).min, np.datetime64("NaT"), latest.astype("datetime64[D]")),
+        index=table.employees
+    )
+
+
+def _window_starts(table: ColumnTable, reference: pd.Series, days: int) -> np.ndarray:
+    """Per row of a store table, the first day after which its employee's window begins"""
+    starts = reference.reindex(table.employees).to_numpy(dtype="datetime64[D]") - np.timedelta64(days, "D")
+    return starts[table.row_employees()]
+
+
+def _recent_mean(table: ColumnTable, column: str, since: np.ndarray) -> pd.Series:
+    """Mean of a column per employee over the rows dated after their row's entry in since"""
+    groups = table.row_employees()
+    used = ~table.nulls[column] & ~table.nulls["date"] & (table.values["date"] > since)
+    counts = np.bincount(groups, weights=used, minlength=len(table.employees))
+    sums = np.bincount(groups, weights=np.where(used, table.values[column], 0.0), minlength=len(table.employees))
+    present = counts > 0
+    return pd.Series(sums[present] / counts[present], index=table.employees[present])
+
+
+def _store_components(tables: Dict[str, ColumnTable]) -> Dict[str, pd.Series]:
+    """
+    The score inputs of _sql_components computed from the analytics store,
+    whose rows are already grouped by employee
+    """
+    reference = pd.concat([
+        _latest_dates(tables[column.class_.__tablename__], column.key) for column in REFERENCE_COLUMNS
+    ]).groupby(level=0).max()
+
+    leaves = tables[LeaveTracker.__tablename__]
+    in_window = ~leaves.nulls["start_date"] & (
+        leaves.values["start_date"] > _window_starts(leaves, reference, settings.RISK_LEAVE_DAYS)
+    )
+    leave_counts = np.bincount(leaves.row_employees(), weights=in_window, minlength=len(leaves.employees))
+
+    # Latest review with NULL dates last; an employee's rows are in id order,
+    # so the first row reaching the employee's latest date has the lowest id
+    performance = tables[PerformanceTracker.__tablename__]
+    groups = performance.row_employees()
+    review_days = np.where(
+        performance.nulls["review_date"], np.iinfo(np.int64).min, performance.values["review_date"].astype(np.int64)
+    )
+    latest_days = np.maximum.reduceat(review_days, performance.offsets[:-1]) if len(groups) else review_days
+    candidates = np.flatnonzero(review_days == latest_days[groups])
+    latest = candidates[np.r_[True, groups[candidates][1:] != groups[candidates][:-1]]] if len(candidates) else candidates
+    ratings = np.where(performance.nulls["rating"][latest], np.nan, performance.values["rating"][latest])
+
+    activity = tables[ActivityTracker.__tablename__]
+    vibes = tables[VibeMeter.__tablename__]
+    return {
+        "as_of": reference,
+        "avg_work_hours": _recent_mean(activity, "work_hours", _window_starts(
+            activity, _latest_dates(activity, "date"), settings.RISK_RECENT_DAYS
+        )),
+        "leaves": pd.Series(leave_counts[leave_counts > 0], index=leaves.employees[leave_counts > 0]),
+        "last_rating": pd.Series(ratings, index=performance.employees[groups[latest]]),
+        "avg_mood": _recent_mean(vibes, "mood_score", _window_starts(
+            vibes, _latest_dates(vibes, "date"), settings.RISK_RECENT_DAYS
+        )),
+        "last_reward": _latest_dates(tables[RewardsTracker.__tablename__], "date"),
+    }
+
+
+def risk_components(db: Session, employee_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Score inputs per employee, from grouped queries or for everybody from
+    the analytics store when it is enabled.
+
+    Windows end at the employee's own latest dates, see REFERENCE_COLUMNS,
+    so a new row only moves the windows of the employee it belongs to.
+    Without employee IDs every employee in the employee table or any
+    tracker is included. A few employees are cheaper to read with IN
+    lists than to pick out of a pass over the whole store.
+    """
+    employee_ids = None if employee_ids is None else sorted({str(employee_id) for employee_id in employee_ids})
+    tables = get_store_tables(db) if employee_ids is None else None
+    if tables is not None:
+        columns = _store_components(tables)
+    else:
+        columns = _sql_components(db, employee_ids)
+
+    # Dates are joined as day numbers like the other inputs
+    for name in ("as_of", "last_reward"):
+        days = pd.to_datetime(columns[name]).to_numpy().astype("datetime64[D]")
+        columns[name] = pd.Series(
+            np.where(np.isnat(days), np.nan, days.astype(np.int64).astype(np.float64)), index=columns[name].index
+        )
+
+    if employee_ids is None:
+        people = db.execute(select(Employee.employee_id).where(Employee.employee_id.isnot(None))).scalars().all()
+    else:
+        people = employee_ids
+    # One hash pass over every key gives each employee a code, far cheaper
+    # than joining string indexes. Codes follow first appearance, so the
+    # people come first and a subset is the leading rows.
+    keys = [np.asarray(people, dtype=object)] + [series.index.to_numpy(dtype=object) for series in columns.values()]
+    codes, population = pd.factorize(np.concatenate(keys))
+    values = {}
+    start = len(people)
+    for name, series in columns.items():
+        column = np.full(len(population), np.nan)
+        column[codes[start:start + len(series)]] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        values[name] = column
+        start += len(series)
+
+    frame = pd.DataFrame(values, index=pd.Index(population, name="employee_id"))
+    if employee_ids is not None:
+        frame = frame.iloc[:len(people)]
+    frame["leaves"] = frame["leaves"].fillna(0).astype(np.int64)
+    frame["days_since_reward"] = (frame["as_of"] - frame.pop("last_reward")).astype("Int64")
+    frame["as_of"] = pd.to_datetime(frame["as_of"], unit="D").dt.date
+    return frame
+
+
+def score_components(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Composite score from 0 to 100. Each component is mapped linearly from
+    its no-concern value (0) to its full-concern value (1), clipped, and
+    the weighted mean is scaled to 100.
+    """
+    total = np.zeros(len(frame))
+    weights = 0.0
+    for name, (calm, concern, weight, missing) in RISK_COMPONENTS.items():
+        values = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+        risk = np.clip((values - calm) / (concern - calm), 0.0, 1.0)
+        risk[np.isnan(values)] = missing
+        total += weight * risk
+        weights += weight
+    return np.round(100.0 * total / weights, 2)
+
+
+def risk_frame(db: Session, employee_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Rows of the employee_risk table for some or all employees"""
+    frame = risk_components(db, employee_ids)
+    frame["score"] = score_components(frame)
+    return frame.reset_index()[RISK_COLUMNS]
+
+
+def rebuild_risk_scores(db: Session) -> int:
+    """
+    Recompute every score and commit.
+
+    Writers are held off while it runs, as with the report aggregates, so
+    a refresh committed meanwhile is not overwritten by older figures.
+    """
+    started = time.perf_counter()
+    if is_postgresql(db):
+        db.execute(text(f"LOCK TABLE {EmployeeRisk.__tablename__} IN EXCLUSIVE MODE"))
+    # On SQLite the DELETE takes the write lock before the trackers are read
+    db.execute(delete(EmployeeRisk))
+    rows = bulk_insert_frame(db, EmployeeRisk, risk_frame(db))
+    db.commit()
+    logger.info(f"Scored {rows} employees in {time.perf_counter() - started:.2f}s")
+    return rows
+
+
+def _upsert_scores(db: Session, frame: pd.DataFrame) -> None:
+    table = EmployeeRisk.__table__
+    statement = dialect_insert(db, table)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["employee_id"],
+            set_={column: statement.excluded[column] for column in RISK_COLUMNS[1:]}
+        ),
+        frame_to_records(frame)
+    )
+
+
+def refresh_risk_scores(db: Session, table_name: str, employee_ids: Optional[Iterable[str]] = None) -> None:
+    """
+    Bring scores up to date after a committed write to a table.
+
+    Windows are per employee, so only the touched employees are rescored.
+    A write that touches too many or unknown employees, or comes before
+    the first build, recomputes everybody. Failures are logged, the write
+    itself is already committed.
+    """
+    if table_name not in RISK_TABLES:
+        return
+    try:
+        stored = db.execute(select(EmployeeRisk.employee_id).limit(1)).first()
+        employee_ids = None if employee_ids is None else {str(employee_id) for employee_id in employee_ids}
+        if stored is None or employee_ids is None or len(employee_ids) > INCREMENTAL_LIMIT:
+            rebuild_risk_scores(db)
+            return
+        if employee_ids:
+            _upsert_scores(db, risk_frame(db, employee_ids))
+            db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception(f"Refreshing risk scores after a write to {table_name} failed")
+
+
+def ranked_risk(db: Session, limit: int = 50, cursor: Optional[str] = None, department: Optional[str] = None,
+                min_score: Optional[float] = None, include_total: bool = False) -> Dict[str, Any]:
+    """
+    A page of employees ranked by score, highest first.
+
+    Pages continue after the cursor's (score, employee_id) position. The
+    scores are built on first use when no write has built them yet.
+    """
+    if db.execute(select(EmployeeRisk.employee_id).limit(1)).first() is None:
+        rebuild_risk_scores(db)
+
+    criteria = []
+    if department is not None:
+        criteria.append(EmployeeRisk.employee_id.in_(
+            select(Employee.employee_id).where(Employee.department == department)
+        ))
+    if min_score is not None:
+        criteria.append(EmployeeRisk.score >= min_score)
+
+    query = select(*EmployeeRisk.__table__.columns).where(*criteria)
+    if cursor is not None:
+        position = decode_cursor(cursor)
+        score, employee_id = position.get("score"), position.get("employee_id")
+        if not isinstance(score, (int, float)) or not isinstance(employee_id, str):
+            raise InvalidCursor("Pagination cursor does not belong to this query")
+        query = query.where(or_(
+            EmployeeRisk.score < score,
+            and_(EmployeeRisk.score == score, EmployeeRisk.employee_id > employee_id)
+        ))
+
+    # One extra row tells whether another page follows
+    rows = [dict(row._mapping) for row in db.execute(
+        query.order_by(EmployeeRisk.score.desc(), EmployeeRisk.employee_id).limit(limit + 1)
+    )]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(score=rows[-1]["score"], employee_id=rows[-1]["employee_id"]) if has_more else None
+
+    total = None
+    if include_total:
+        total = db.execute(select(func.count()).select_from(EmployeeRisk).where(*criteria)).scalar()
+    return {
+        "data": rows,
+        "pagination": {"limit": limit, "next_cursor": next_cursor, "has_more": has_more, "total": total},
+    }
@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.table_stats import TableStats
+from app.services.bulk_insert import dialect_insert, is_postgresql
+
+logger = logging.getLogger(__name__)
+
+
+def adjust_row_count(db: Session, table_name: str, delta: int) -> None:
+    """
+    Add delta to a table's counter inside the caller's transaction.
+    
+    Counters that were never seeded stay missing, the next exact count
+    creates them.
+    """
+    if delta:
+        db.query(TableStats).filter(TableStats.table_name == table_name).update(
+            {"row_count": TableStats.row_count + delta, "updated_at": datetime.utcnow()},
+            synchronize_session=False
+        )
+
+
+def invalidate_row_count(db: Session, table_name: str) -> None:
+    """Drop a counter after a write whose effect on the row count is unknown"""
+    db.query(TableStats).filter(TableStats.table_name == table_name).delete(synchronize_session=False)
+
+
+def estimate_row_count(db: Session, table_name: str) -> Optional[int]:
+    """Planner statistics estimate, None when the table was never analysed"""
+    try:
+        if is_postgresql(db):
+            estimate = db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table AND relkind = 'r'"),
+                {"table": table_name}
+            ).scalar()
+            # reltuples is -1 (0 before PostgreSQL 14) until VACUUM or ANALYZE has run
+            return estimate if estimate is not None and estimate > 0 else None
+        if db.get_bind().dialect.name == "sqlite":
+            stat = db.execute(
+                text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"), {"table": table_name}
+            ).scalar()
+            return int(stat.split()[0]) if stat else None
+    except SQLAlchemyError:
+        # sqlite_stat1 only exists once ANALYZE has run
+        db.rollback()
+    return None
+
+
+def exact_row_count(db: Session, model) -> int:
+    """Count a table and store the result as its counter"""
+    table_name = model.__tablename__
+    count = db.execute(select(func.count()).select_from(model)).scalar()
+    statement = dialect_insert(db, TableStats.__table__).values(
+        table_name=table_name, row_count=count, updated_at=datetime.utcnow()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={"row_count": statement.excluded.row_count, "updated_at": statement.excluded.updated_at}
+    ))
+    db.commit()
+    return count
+
+
+def get_row_count(db: Session, model, exact: bool = False) -> Tuple[int, str]:
+    """
+    Return (row count, source) for a table in constant time where possible.
+    
+    The source is "counter" for the maintained counter, "estimate" for
+    planner statistics and "exact" when the table had to be counted, which
+    also seeds the counter.
+    """
+    if not exact:
+        counter = db.query(TableStats.row_count).filter(TableStats.table_name == model.__tablename__).scalar()
+        if counter is not None:
+            return counter, "counter"
+        estimate = estimate_row_count(db, model.__tablename__)
+        if estimate is not None:
+            return estimate, "estimate"
+    return exact_row_count(db, model), "exact"
@@ -0,0 +1,72 @@
+import threading
+from typing import Any, Dict, Iterable, List, Sequence
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# Columns never returned by the read endpoints
+SENSITIVE_COLUMNS = frozenset({"hashed_password"})
+
+_serializers: Dict[type, "RowSerializer"] = {}
+_serializers_lock = threading.Lock()
+
+
+class RowSerializer:
+    """
+    Precompiled column list for reading a model as plain rows.
+
+    Reads go through a Core select of the columns, so no ORM instances or
+    identity map entries are created, and rows are turned into dicts or
+    encoded to JSON with orjson, which handles dates natively.
+    """
+
+    def __init__(self, model, exclude: Iterable[str] = SENSITIVE_COLUMNS):
+        self.model = model
+        self.columns = [column for column in model.__table__.columns if column.name not in exclude]
+        self.names = tuple(column.name for column in self.columns)
+
+    def select(self, *criteria):
+        """Core select of the serialized columns with optional WHERE criteria"""
+        query = select(*self.columns)
+        return query.where(*criteria) if criteria else query
+
+    def fetch(self, db: Session, *criteria, order_by=None) -> List[Any]:
+        """Run the select and return the raw rows, which support attribute access"""
+        query = self.select(*criteria)
+        if order_by is not None:
+            query = query.order_by(order_by)
+        return db.execute(query).all()
+
+    def first(self, db: Session, *criteria, order_by=None):
+        """Return the first matching row or None"""
+        query = self.select(*criteria)
+        if order_by is not None:
+            query = query.order_by(order_by)
+        return db.execute(query.limit(1)).first()
+
+    def to_dicts(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        names = self.names
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetch_dicts(self, db: Session, *criteria, order_by=None) -> List[Dict[str, Any]]:
+        return self.to_dicts(self.fetch(db, *criteria, order_by=order_by))
+
+
+def get_serializer(model) -> RowSerializer:
+    """Return the shared serializer for a model, building it on first use"""
+    serializer = _serializers.get(model)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.setdefault(model, RowSerializer(model))
+    return serializer
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode a response payload, including dates and numpy scalars, to JSON bytes"""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_lines(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encode rows as newline-delimited JSON objects"""
+    return b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
@@ -0,0 +1,174 @@
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.activity import ActivityTracker
+from app.models.employee import Employee
+from app.models.performance import PerformanceTracker
+from app.models.vibemeter import VibeMeter
+from app.services.bulk_insert import is_postgresql
+from app.services.pagination import InvalidQuery
+
+logger = logging.getLogger(__name__)
+
+# Metric name to (table, value column, date column)
+TIMESERIES_METRICS = {
+    "mood_score": (VibeMeter, "mood_score", "date"),
+    "work_hours": (ActivityTracker, "work_hours", "date"),
+    "teams_messages_sent": (ActivityTracker, "teams_messages_sent", "date"),
+    "emails_sent": (ActivityTracker, "emails_sent", "date"),
+    "meetings_attended": (ActivityTracker, "meetings_attended", "date"),
+    "rating": (PerformanceTracker, "rating", "review_date"),
+}
+
+# Bucket name to the pandas frequency of its start dates, weeks start on Monday
+BUCKETS = {"day": "D", "week": "W-MON", "month": "MS"}
+
+AGGREGATES = ("avg", "sum", "count")
+
+
+def _bucket_start(db: Session, bucket: str, column):
+    """SQL expression for the first day of the bucket a date falls in"""
+    if is_postgresql(db):
+        return func.date_trunc(bucket, column)
+    if bucket == "week":
+        # Forward to the Sunday ending the week, then back to its Monday
+        return func.date(column, "weekday 0", "-6 days")
+    if bucket == "month":
+        return func.strftime("%Y-%m-01", column)
+    return func.date(column)
+
+
+def bucketed_totals(db: Session, metric: str, bucket: str, employee_id: Optional[str] = None,
+                    department: Optional[str] = None, date_from: Optional[date] = None,
+                    date_to: Optional[date] = None) -> pd.DataFrame:
+    """
+    Sum and count of a metric per bucket, computed in the database.
+
+    Returns a frame indexed by bucket start date with total and count
+    columns, one row per bucket from the first to the last bucket with
+    data, empty buckets included as zeros.
+    """
+    if metric not in TIMESERIES_METRICS:
+        raise InvalidQuery(f"Unknown metric '{metric}', expected one of: {', '.join(TIMESERIES_METRICS)}")
+    if bucket not in BUCKETS:
+        raise InvalidQuery(f"Unknown bucket '{bucket}', expected one of: {', '.join(BUCKETS)}")
+
+    model, value_name, date_name = TIMESERIES_METRICS[metric]
+    value, day = getattr(model, value_name), getattr(model, date_name)
+    criteria = [value.isnot(None), day.isnot(None)]
+    if employee_id is not None:
+        criteria.append(model.employee_id == employee_id)
+    if department is not None:
+        criteria.append(model.employee_id.in_(select(Employee.employee_id).where(Employee.department == department)))
+    if date_from is not None:
+        criteria.append(day >= date_from)
+    if date_to is not None:
+        criteria.append(day <= date_to)
+
+    start = _bucket_start(db, bucket, day).label("bucket")
+    rows = db.execute(
+        select(start, func.sum(value).label("total"), func.count(value).label("count"))
+        .where(*criteria).group_by(start).order_by(start)
+    ).all()
+
+    frame = pd.DataFrame(rows, columns=["bucket", "total", "count"])
+    if frame.empty:
+        return frame.set_index("bucket")
+    # SQLite returns date strings, PostgreSQL timestamps
+    frame["bucket"] = pd.to_datetime(frame["bucket"]).dt.tz_localize(None).dt.normalize()
+    frame = frame.astype({"total": np.float64, "count": np.int64}).set_index("bucket")
+    buckets = pd.date_range(frame.index[0], frame.index[-1], freq=BUCKETS[bucket])
+    return frame.reindex(buckets, fill_value=0)
+
+
+def bucket_values(totals: pd.DataFrame, aggregate: str, window: Optional[int] = None) -> pd.Series:
+    """
+    The value plotted for each bucket, NaN for averages of empty buckets.
+
+    With a window, averages are taken over that many buckets weighted by
+    their counts, sums and counts are averaged per bucket over the window.
+    """
+    if aggregate not in AGGREGATES:
+        raise InvalidQuery(f"Unknown aggregate '{aggregate}', expected one of: {', '.join(AGGREGATES)}")
+    if window and window > 1:
+        rolled = totals[["total", "count"]].rolling(window, min_periods=1)
+        if aggregate == "avg":
+            sums = rolled.sum()
+            return sums["total"] / sums["count"].replace(0, np.nan)
+        return rolled.mean()["total" if aggregate == "sum" else "count"]
+    if aggregate == "avg":
+        return totals["total"] / totals["count"].replace(0, np.nan)
+    return totals["total" if aggregate == "sum" else "count"].astype(np.float64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. Every bucket in between
+    keeps the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves peaks and
+    troughs that plain decimation would drop.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (length - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        stop = int((i + 1) * every) + 1
+        next_stop = min(int((i + 2) * every) + 1, length)
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def metric_timeseries(db: Session, metric: str, bucket: str = "week", aggregate: str = "avg",
+                      window: Optional[int] = None, max_points: int = 500, employee_id: Optional[str] = None,
+                      department: Optional[str] = None, date_from: Optional[date] = None,
+                      date_to: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Bucketed trend of a metric, downsampled to at most max_points points.
+
+    Buckets without data are left out of averages rather than plotted as
+    zero, each point carries the number of values in its own bucket.
+    """
+    totals = bucketed_totals(db, metric, bucket, employee_id, department, date_from, date_to)
+    values = bucket_values(totals, aggregate, window)
+    present = values.notna().to_numpy()
+    dates = values.index[present]
+    y = values.to_numpy()[present]
+    counts = totals["count"].to_numpy()[present]
+
+    kept = lttb(dates.to_numpy().astype("datetime64[D]").astype(np.int64), y, max_points)
+    points: List[Dict[str, Any]] = [
+        {"date": dates[i].date(), "value": float(y[i]), "count": int(counts[i])}
+        for i in kept
+    ]
+    return {
+        "metric": metric,
+        "bucket": bucket,
+        "aggregate": aggregate,
+        "window": window,
+        "buckets": len(y),
+        "downsampled": len(points) < len(y),
+        "points": points,
+    }
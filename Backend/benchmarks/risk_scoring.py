@@ -0,0 +1,97 @@
+"""
+Benchmark for the employee risk scores behind /analytics/risk.
+
+Loads synthetic tracker tables for the requested number of employees and
+times the phases of a full recompute and of an incremental refresh:
+
+    store_load     first load of the analytics store (with --store only)
+    components     per-employee inputs, from grouped queries or with --store
+                   from the analytics store, joined on employee ID
+    score          NumPy composite score over every employee
+    rebuild        full recompute written back to employee_risk (all of the above)
+    incremental    rescoring the employees of a small upload, always from SQL
+
+Usage (from the Backend directory):
+    python -m benchmarks.risk_scoring --employees 100000 --rows 400000 [--store]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full and incremental risk score recomputes")
+    parser.add_argument("--employees", type=int, default=100000, help="Distinct employee IDs")
+    parser.add_argument("--rows", type=int, default=400000, help="Rows per tracker table")
+    parser.add_argument("--touched", type=int, default=100, help="Employees rescored by the incremental refresh")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per phase, the fastest is reported")
+    parser.add_argument("--store", action="store_true", help="Compute the inputs from the analytics store")
+    parser.add_argument("--database-url", default=None, help="Database to benchmark (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ["ANALYTICS_STORE_ENABLED"] = "true" if args.store else "false"
+    # 400k rows per table take a few hundred MB, more than the default budget
+    os.environ.setdefault("ANALYTICS_STORE_MAX_BYTES", str(4 * 1024 ** 3))
+
+    import pandas as pd
+    from sqlalchemy import delete
+
+    from app.core.database import Base, SessionLocal, engine
+    from app.models.employee_risk import EmployeeRisk
+    from app.services.analytics_store import get_store_tables
+    from app.services.csv_processor import CSVProcessor
+    from app.services.risk_scores import (
+        RISK_TABLES, rebuild_risk_scores, refresh_risk_scores, risk_components, score_components
+    )
+    from benchmarks.row_serialization import best_of
+    from benchmarks.synthetic import generate_all
+
+    Base.metadata.create_all(bind=engine)
+    paths = generate_all(args.rows, args.employees, work_dir)
+    with SessionLocal() as db:
+        processor = CSVProcessor(db)
+        db.execute(delete(EmployeeRisk))
+        for path in paths.values():
+            frame = pd.read_csv(path)
+            table_name = processor._identify_table(list(frame.columns))
+            if table_name in RISK_TABLES:
+                db.execute(delete(processor.table_models[table_name]))
+                # Straight to the bulk insert, the scores are timed below
+                processor._insert_frame(processor._prepare_frame(frame, table_name), table_name)
+
+        results = {}
+        if args.store:
+            started = time.perf_counter()
+            get_store_tables(db)
+            results["store_load"] = time.perf_counter() - started
+
+        components, components_seconds = best_of(args.repeats, lambda: risk_components(db))
+        _, score_seconds = best_of(args.repeats, lambda: score_components(components))
+        scored, rebuild_seconds = best_of(args.repeats, lambda: rebuild_risk_scores(db))
+        touched = list(components.index[:args.touched])
+        _, incremental_seconds = best_of(args.repeats, lambda: refresh_risk_scores(db, "vibe_meter", touched))
+
+    results.update({
+        "components": components_seconds,
+        "score": score_seconds,
+        "rebuild": rebuild_seconds,
+        "incremental": incremental_seconds,
+    })
+    for name, seconds in results.items():
+        print(f"{name:<12} {seconds:>8.3f}s")
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "store": args.store,
+        "employees_scored": scored,
+        "rows_per_table": args.rows,
+        "touched": len(touched),
+        "seconds": {name: round(seconds, 4) for name, seconds in results.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark for reading rows out of the database and encoding them as JSON.
+
+Loads a synthetic activity_tracker table and times three read paths end to
+end, from query to JSON bytes:
+
+    orm_inspect      ORM instances, columns copied via inspect() per record,
+                     encoded with jsonable_encoder + json.dumps (old get_employee_data)
+    orm_dict         ORM instances' __dict__ minus SQLAlchemy state, same encoder
+    row_serializer   Core select through RowSerializer, encoded with orjson
+
+Usage (from the Backend directory):
+    python -m benchmarks.row_serialization --rows 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def best_of(repeats: int, fn):
+    """Run fn several times and return (result, fastest seconds)"""
+    best, result = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ORM and Core row serialization")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows in the benchmark table")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per path, the fastest is reported")
+    parser.add_argument("--database-url", default=None, help="Database to benchmark (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+
+    import pandas as pd
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import delete, inspect
+
+    from app.core.database import Base, SessionLocal, engine
+    from app.models.activity import ActivityTracker
+    from app.services.csv_processor import CSVProcessor
+    from app.services.row_serializer import dumps, get_serializer
+    from benchmarks.synthetic import generate_dataset
+
+    Base.metadata.create_all(bind=engine)
+    path = generate_dataset("activity_tracker_dataset.csv", args.rows, max(500, args.rows // 10), work_dir)
+    with SessionLocal() as db:
+        db.execute(delete(ActivityTracker))
+        db.commit()
+        CSVProcessor(db)._insert_data(pd.read_csv(path), "activity_tracker")
+
+    def orm_inspect():
+        with SessionLocal() as db:
+            records = db.query(ActivityTracker).all()
+            rows = [{column: getattr(record, column) for column in inspect(ActivityTracker).c.keys()} for record in records]
+            return json.dumps(jsonable_encoder(rows)).encode()
+
+    def orm_dict():
+        with SessionLocal() as db:
+            records = db.query(ActivityTracker).all()
+            rows = [{k: v for k, v in record.__dict__.items() if k != "_sa_instance_state"} for record in records]
+            return json.dumps(jsonable_encoder(rows)).encode()
+
+    def row_serializer():
+        with SessionLocal() as db:
+            return dumps(get_serializer(ActivityTracker).fetch_dicts(db))
+
+    results = {}
+    for name, fn in (("orm_inspect", orm_inspect), ("orm_dict", orm_dict), ("row_serializer", row_serializer)):
+        payload, seconds = best_of(args.repeats, fn)
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(args.rows / seconds, 1),
+            "bytes": len(payload),
+        }
+        print(f"{name:<16} {seconds:>8.3f}s  {args.rows / seconds:>12.0f} rows/s")
+
+    baseline = results["orm_inspect"]["seconds"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["seconds"], 1)
+    print(json.dumps({"database": engine.dialect.name, "rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
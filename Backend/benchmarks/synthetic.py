@@ -0,0 +1,123 @@
+"""
+Generate synthetic CSVs shaped like the fixtures in data/.
+
+Rows are resampled from a template fixture so categorical values, scores and
+the relationships between columns keep the template's distribution. Employee
+IDs are drawn uniformly from a pool of the requested size and every date in a
+row is shifted by the same random offset, which keeps spans such as leave
+start/end intact while spreading rows over the template's date range.
+
+Usage (from the Backend directory):
+    python -m benchmarks.synthetic --rows 100000 --employees 10000 --out-dir /tmp/synthetic
+"""
+import argparse
+import os
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.column_converters import detect_date_format
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+# Tabular fixtures, question.csv is a list of chat prompts rather than a table
+TEMPLATES = [
+    "activity_tracker_dataset.csv",
+    "leave_dataset.csv",
+    "onboarding_dataset.csv",
+    "performance_dataset.csv",
+    "rewards_dataset.csv",
+    "vibemeter_dataset.csv",
+]
+
+EMPLOYEE_ID_COLUMN = "Employee_ID"
+
+
+def load_template(filename: str) -> pd.DataFrame:
+    """Read a fixture as text so generated values keep the template's formatting"""
+    return pd.read_csv(os.path.join(DATA_DIR, filename), dtype=str, keep_default_na=False)
+
+
+def employee_id_pool(count: int) -> np.ndarray:
+    """Build employee IDs in the fixtures' EMP0001 style, widened for large pools"""
+    width = max(4, len(str(count - 1)))
+    return np.array([f"EMP{i:0{width}d}" for i in range(count)], dtype=object)
+
+
+def date_columns(template: pd.DataFrame) -> Dict[str, str]:
+    """Map each column whose values all parse as dates to its date format"""
+    columns = {}
+    for column in template.columns:
+        if column == EMPLOYEE_ID_COLUMN:
+            continue
+        fmt = detect_date_format(template[column].replace("", None))
+        if fmt is not None:
+            columns[column] = fmt
+    return columns
+
+
+def scale_template(template: pd.DataFrame, rows: int, employees: int, seed: int = 0) -> pd.DataFrame:
+    """Resample a template into a frame of the given size and employee count"""
+    rng = np.random.default_rng(seed)
+    frame = template.iloc[rng.integers(0, len(template), rows)].reset_index(drop=True)
+
+    if EMPLOYEE_ID_COLUMN in frame.columns:
+        frame[EMPLOYEE_ID_COLUMN] = employee_id_pool(employees)[rng.integers(0, employees, rows)]
+
+    formats = date_columns(template)
+    if formats:
+        # Shift the first date column within the template's range and move the others by the same amount
+        anchor, anchor_format = next(iter(formats.items()))
+        template_dates = pd.to_datetime(template[anchor], format=anchor_format, errors='coerce').dropna()
+        start, span = template_dates.min(), (template_dates.max() - template_dates.min()).days + 1
+
+        anchor_dates = pd.to_datetime(frame[anchor], format=anchor_format, errors='coerce')
+        shifted_days = ((anchor_dates - start).dt.days + rng.integers(0, span, rows)) % span
+        delta = start + pd.to_timedelta(shifted_days, unit="D") - anchor_dates
+
+        for column, fmt in formats.items():
+            dates = pd.to_datetime(frame[column], format=fmt, errors='coerce') + delta
+            frame[column] = dates.dt.strftime(fmt).fillna("")
+
+    return frame
+
+
+def generate_dataset(template_name: str, rows: int, employees: int, out_dir: str, seed: int = 0) -> str:
+    """Write a scaled copy of a fixture to out_dir, reusing an earlier file with the same parameters"""
+    stem = os.path.splitext(template_name)[0]
+    path = os.path.join(out_dir, f"{stem}_{rows}r_{employees}e_s{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        # Give each template its own stream so files of one run do not share row patterns
+        template_seed = seed * 1000003 + zlib.crc32(stem.encode())
+        frame = scale_template(load_template(template_name), rows, employees, template_seed)
+        frame.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def generate_all(rows: int, employees: int, out_dir: str, seed: int = 0,
+                 templates: Optional[List[str]] = None) -> Dict[str, str]:
+    """Generate every template at one size and return template name -> CSV path"""
+    return {
+        name: generate_dataset(name, rows, employees, out_dir, seed)
+        for name in (templates or TEMPLATES)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic CSVs from the data/ fixtures")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows per generated file")
+    parser.add_argument("--employees", type=int, default=10000, help="Distinct employee IDs")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--out-dir", required=True, help="Directory to write the CSVs to")
+    args = parser.parse_args()
+
+    for name, path in generate_all(args.rows, args.employees, args.out_dir, args.seed).items():
+        print(f"{name:<32} {path}")
+
+
+if __name__ == "__main__":
+    main()
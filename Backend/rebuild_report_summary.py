@@ -0,0 +1,35 @@
+import argparse
+import sys
+from app.core.database import engine, Base, SessionLocal
+from app.models.report_aggregate import ReportAggregate
+from app.report.report import check_report_summary
+from app.services.report_summary import rebuild_summary, summary_is_built
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or verify the report_aggregates table behind the collective report")
+    parser.add_argument("--check", action="store_true", help="Only compare the aggregates with the raw tables, exit 1 on a mismatch")
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine, tables=[ReportAggregate.__table__])
+    db = SessionLocal()
+    try:
+        if not args.check:
+            rows = rebuild_summary(db)
+            print(f"Rebuilt report aggregates ({rows} rows)")
+        elif not summary_is_built(db):
+            print("Report aggregates are not built, run this script without --check or ingest a file")
+            return 1
+        
+        differences = check_report_summary(db)
+        if differences:
+            print("Report aggregates do not match the raw tables:")
+            for key, (expected, actual) in differences.items():
+                print(f"  {key}: expected {expected!r}, aggregates give {actual!r}")
+            return 1
+        print("Report aggregates match the raw tables")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,9 +9,16 @@ from app.models.performance import PerformanceTracker
 from app.models.rewards import RewardsTracker
 from app.models.employee import Employee
 from app.models.onboarding import OnboardingTracker
+from app.models.ingested_file import IngestedFile
+from app.models.background_job import BackgroundJob, JobDependency
+from app.models.table_stats import DataVersion, TableStats
+from app.models.report_aggregate import ReportAggregate
+from app.models.employee_risk import EmployeeRisk
 from app.models.user import User, UserRole
 from app.models.chat import ChatMessage
 from app.core.auth import get_password_hash
+from app.services.natural_keys import sync_natural_key_indexes
+from app.services.report_summary import ensure_summary_built
 from sqlalchemy.orm import Session
 from app.config import settings
 
@@ -37,6 +44,12 @@ def reset_database():
     # Create a database session
     db = SessionLocal()
     
+    # Unique indexes the upsert modes of the CSV ingest rely on
+    sync_natural_key_indexes(db)
+    
+    # Aggregates behind the collective report, which never builds them itself
+    ensure_summary_built(db)
+    
     # Create default HR user
     hr_user = User(
         email="hr@example.com",